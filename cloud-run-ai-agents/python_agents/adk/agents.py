@@ -4,10 +4,35 @@ ADK Agents - Wrapper around google.adk with compatibility layer
 
 from google.adk.agents import LlmAgent as _GoogleLlmAgent, Agent as _GoogleAgent
 import google.generativeai as genai
+import asyncio
+import contextvars
+import functools
 import os
-from typing import Any, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
 import json
 
+from python_agents import gemini_config
+
+
+# Shared pool for the blocking Gemini SDK calls made by the agents, so the
+# event loop keeps serving other requests during each round-trip. Size it to
+# requests-per-second x average latency (e.g. 2000 RPM x 2s ~= 70)
+_GEMINI_POOL = ThreadPoolExecutor(
+    max_workers=int(os.getenv("GEMINI_POOL", 16)),
+    thread_name_prefix="gemini"
+)
+
+
+async def run_blocking(func: Callable, *args, **kwargs) -> Any:
+    """Run a blocking SDK call on the shared Gemini thread pool."""
+    loop = asyncio.get_running_loop()
+    # Carry the caller's contextvars into the worker thread, as asyncio.to_thread does
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(
+        _GEMINI_POOL, functools.partial(context.run, func, *args, **kwargs)
+    )
+
 
 class AgentResponse:
     """Simple response wrapper"""
@@ -27,11 +52,6 @@ class LlmAgent:
         self.model_name = model
         self.instruction = instruction
 
-        # Configure genai
-        api_key = os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY")
-        if api_key:
-            genai.configure(api_key=api_key)
-
         # Map model names to actual Gemini model IDs
         model_mapping = {
             "gemini-2.5-flash": "gemini-2.5-flash",
@@ -40,6 +60,8 @@ class LlmAgent:
         }
         actual_model = model_mapping.get(model, model)
 
+        gemini_config.configure()
+
         # Create underlying Gemini model
         self.gemini_model = genai.GenerativeModel(
             actual_model,
@@ -84,10 +106,10 @@ class LlmAgent:
                         # Assume it's already a PIL Image
                         content_parts.append(image_data)
 
-                response = self.gemini_model.generate_content(content_parts)
+                response = await run_blocking(self.gemini_model.generate_content, content_parts)
             else:
                 # Text-only input
-                response = self.gemini_model.generate_content(text_input)
+                response = await run_blocking(self.gemini_model.generate_content, text_input)
 
             # Safely extract text from response
             try:
@@ -132,4 +154,4 @@ class LlmAgent:
 # Also export the original classes
 Agent = _GoogleAgent
 
-__all__ = ['LlmAgent', 'Agent']
+__all__ = ['LlmAgent', 'Agent', 'run_blocking']
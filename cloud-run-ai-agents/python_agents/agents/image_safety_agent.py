@@ -4,17 +4,29 @@ Checks generated images for harmful content using Google ADK framework
 Uses Gemini 2.5 Flash multimodal capabilities for image analysis
 """
 
-from python_agents.adk.agents import LlmAgent
+from python_agents.adk.agents import LlmAgent, run_blocking
 from python_agents.adk.models import get_model
+from python_agents.gemini_config import API_KEY
 import json
 from datetime import datetime
 from typing import Dict, Any, Optional
 import base64
-from PIL import Image
-import io
 import requests
 from google import genai
-import os
+from google.genai import types
+
+
+def _image_mime_type(image_data: bytes) -> Optional[str]:
+    """Identify PNG, JPEG, GIF or WebP data from its file signature."""
+    if image_data.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if image_data.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if image_data.startswith(b"GIF8"):
+        return "image/gif"
+    if image_data[:4] == b"RIFF" and image_data[8:12] == b"WEBP":
+        return "image/webp"
+    return None
 
 
 class ImageSafetyAgent:
@@ -28,11 +40,10 @@ class ImageSafetyAgent:
         self.model_name = model_name
 
         # Initialize Google GenAI client for vision analysis
-        api_key = os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY")
-        if not api_key:
+        if not API_KEY:
             raise ValueError("GOOGLE_API_KEY or GEMINI_API_KEY environment variable must be set")
 
-        self.genai_client = genai.Client(api_key=api_key)
+        self.genai_client = genai.Client(api_key=API_KEY)
 
         # System instruction for safety analysis
         self.system_instruction = """You are an image content safety moderator for a children's educational platform.
@@ -77,13 +88,45 @@ Always respond with structured JSON format for safety analysis."""
             if not image_data:
                 return self._create_error_response("Failed to download image for analysis")
 
-            # Convert image bytes to PIL Image
-            try:
-                image = Image.open(io.BytesIO(image_data))
-                print(f"   📸 Image loaded: {image.format} {image.size} {image.mode}")
-            except Exception as e:
-                print(f"❌ [{self.name}] Failed to load image: {str(e)}")
-                return self._create_error_response(f"Failed to load image: {str(e)}")
+            return await self.validate_image_bytes(image_data, age_group, context, image_url)
+
+        except Exception as e:
+            print(f"❌ [{self.name}] Error: {str(e)}")
+            return self._create_error_response(
+                f"Image safety check encountered an error: {str(e)}"
+            )
+
+    async def validate_image_bytes(
+        self,
+        image_data: bytes,
+        age_group: str,
+        context: Optional[str] = None,
+        image_url: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Validate raw image bytes for safety issues.
+
+        Lets callers check a freshly generated image without waiting for
+        it to be uploaded and downloaded again.
+
+        Args:
+            image_data: Image bytes to analyze
+            age_group: Age group (e.g., "7-11", "11-14")
+            context: Optional story context for better analysis
+            image_url: Optional URL of the image, echoed in the result
+
+        Returns:
+            Safety validation result with alerts if needed
+        """
+        try:
+            # Send the encoded bytes as-is rather than decoding them with PIL
+            # only for the SDK to re-encode the bitmap
+            mime_type = _image_mime_type(image_data)
+            if mime_type is None:
+                print(f"❌ [{self.name}] Failed to load image: unrecognized format")
+                return self._create_error_response("Failed to load image: unrecognized format")
+            image = types.Part.from_bytes(data=image_data, mime_type=mime_type)
+            print(f"   📸 Image loaded: {mime_type} ({len(image_data)} bytes)")
 
             # Create comprehensive safety check prompt
             context_text = f"\n\nStory context: {context}" if context else ""
@@ -125,7 +168,8 @@ Respond ONLY with valid JSON in this exact structure:
 
             # Use Gemini 2.5 Flash with direct vision capabilities
             print(f"   🔍 Analyzing image with Gemini 2.5 Flash vision...")
-            response = self.genai_client.models.generate_content(
+            response = await run_blocking(
+                self.genai_client.models.generate_content,
                 model="gemini-2.5-flash",
                 contents=[image, prompt]
             )
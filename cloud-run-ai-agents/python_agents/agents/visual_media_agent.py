@@ -4,13 +4,12 @@ Generates images and videos from student writing using Google ADK framework
 Uses Gemini 2.5 Flash Image and Veo 3.1 for media generation
 """
 
-from python_agents.adk.agents import LlmAgent
+from python_agents.adk.agents import LlmAgent, run_blocking
 from python_agents.adk.models import get_model
+from python_agents.gemini_config import API_KEY
 import json
 from datetime import datetime
 from typing import Dict, Any, Optional
-import google.generativeai as genai
-import os
 
 
 class VisualMediaAgent:
@@ -23,15 +22,10 @@ class VisualMediaAgent:
         self.name = "VisualMediaAgent"
         self.model_name = model_name
 
-        # Initialize Google Generative AI for image/video generation
-        api_key = os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY")
-        if api_key:
-            genai.configure(api_key=api_key)
-
         # Initialize GenAI client for video generation
         try:
             from google import genai as google_genai
-            self.genai_client = google_genai.Client(api_key=api_key)
+            self.genai_client = google_genai.Client(api_key=API_KEY)
         except Exception as e:
             print(f"⚠️  Warning: Could not initialize GenAI client: {e}")
             self.genai_client = None
@@ -258,7 +252,8 @@ Respond with JSON:
             # Generate image with Gemini 2.5 Flash Image model
             from google.genai import types
 
-            response = self.genai_client.models.generate_content(
+            response = await run_blocking(
+                self.genai_client.models.generate_content,
                 model='gemini-2.5-flash-image',
                 contents=[image_prompt],
                 config=types.GenerateContentConfig(
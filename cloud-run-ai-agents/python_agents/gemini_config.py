@@ -0,0 +1,35 @@
+"""
+Gemini Config - Process-wide Gemini API key, configured once on first use
+"""
+
+import os
+from typing import Optional
+
+import google.generativeai as genai
+
+API_KEY = os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY")
+
+_CONFIGURED = False
+
+
+def configure() -> Optional[str]:
+    """
+    Configure google.generativeai with the API key, once per process.
+
+    configure() rebuilds the SDK's client state, so later calls are no-ops.
+    A missing key is not an error here; require_api_key() reports it at call
+    time so the service (and its health checks) still start without one.
+    """
+    global _CONFIGURED
+    if API_KEY and not _CONFIGURED:
+        genai.configure(api_key=API_KEY)
+        _CONFIGURED = True
+    return API_KEY
+
+
+def require_api_key() -> str:
+    """Return the Gemini API key, raising if none is configured."""
+    if not API_KEY:
+        raise Exception("No API key found for Gemini")
+    configure()
+    return API_KEY
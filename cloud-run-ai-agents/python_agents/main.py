@@ -9,19 +9,61 @@ from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 from typing import Optional
 from contextlib import asynccontextmanager
+from types import MappingProxyType
 import os
+import sys
+import json
+import logging
+import traceback
 from datetime import datetime
 
 # Import ADK tools
 from .tools import (
     check_content_safety,
     analyze_student_writing,
-    generate_image_from_writing,
-    generate_video_from_writing,
-    upload_image_to_gcs,
-    upload_video_to_gcs,
+    generate_and_upload_image,
+    generate_and_upload_video,
     validate_image_safety
 )
+from .tools.http_session import close_http_session
+
+class _JsonLogFormatter(logging.Formatter):
+    """Format each record as one JSON line, which Cloud Logging parses into fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "severity": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+# Send application loggers to stdout alongside uvicorn's output. Configured
+# at import so every uvicorn worker process picks it up. LOG_FORMAT=json
+# emits structured entries instead of plain text.
+_log_handler = logging.StreamHandler(sys.stdout)
+if os.getenv("LOG_FORMAT", "text").lower() == "json":
+    _log_handler.setFormatter(_JsonLogFormatter())
+else:
+    _log_handler.setFormatter(logging.Formatter("%(levelname)s:     %(name)s - %(message)s"))
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
+    handlers=[_log_handler]
+)
+logger = logging.getLogger(__name__)
+
+# Full stack traces are only returned to clients in development
+_IS_DEV = os.getenv("NODE_ENV") == "development"
+
+# Safety result reported when ENABLE_IMAGE_SAFETY is off
+SAFETY_CHECK_DISABLED_TEMPLATE = MappingProxyType({
+    "isSafe": True,
+    "riskLevel": "none",
+    "reasoning": "Safety validation disabled"
+})
 
 
 # Lifespan context manager for startup/shutdown
@@ -33,13 +75,16 @@ async def lifespan(app: FastAPI):
     print("   • check_content_safety")
     print("   • analyze_student_writing")
     print("   • generate_image_from_writing")
+    print("   • generate_and_upload_image")
     print("   • generate_video_from_writing")
+    print("   • generate_and_upload_video")
     print("   • upload_image_to_gcs")
     print("   • upload_video_to_gcs")
     print("   • validate_image_safety")
     print("\n✅ Service ready!\n")
     yield
     # Shutdown
+    await close_http_session()
     print("\n👋 Shutting down AI Agents service...\n")
 
 
@@ -115,7 +160,9 @@ async def health_check():
             "check_content_safety",
             "analyze_student_writing",
             "generate_image_from_writing",
+            "generate_and_upload_image",
             "generate_video_from_writing",
+            "generate_and_upload_video",
             "upload_image_to_gcs",
             "upload_video_to_gcs",
             "validate_image_safety"
@@ -145,7 +192,7 @@ async def analyze_writing(request: AnalyzeWritingRequest):
         print(f"   Age Group: {request.ageGroup}")
 
         # Use ADK tool for analysis (includes safety check)
-        result = analyze_student_writing(
+        result = await analyze_student_writing(
             student_writing=request.studentWriting,
             original_prompt=request.originalPrompt,
             age_group=request.ageGroup,
@@ -190,7 +237,7 @@ async def generate_image(request: GenerateImageRequest):
     This endpoint:
     1. Generates image from student writing
     2. Uploads to Google Cloud Storage
-    3. (Optional) Validates image safety
+    3. (Optional) Validates image safety, alongside the upload
     4. Returns image URL
 
     Backend is responsible for:
@@ -199,69 +246,44 @@ async def generate_image(request: GenerateImageRequest):
     - Verifying submission score
     """
     try:
-        print(f"\n🖼️  Image Generation Request")
-        print(f"   Submission: {request.submissionId}")
-        print(f"   Style: {request.imageStyle}, Index: {request.imageIndex}")
+        logger.info("🖼️  Image Generation Request")
+        logger.info("Submission: %s", request.submissionId)
+        logger.info("Style: %s, Index: %s", request.imageStyle, request.imageIndex)
 
-        # Step 1: Generate image using ADK tool
-        print(f"\n🎨 Step 1: Generating image...")
-        image_result = generate_image_from_writing(
+        # OPTION A: Enable safety validation
+        safety_enabled = os.getenv("ENABLE_IMAGE_SAFETY", "false").lower() == "true"
+
+        # Steps 1-3: Generate image, then upload to GCS and (optionally)
+        # validate its safety concurrently using ADK tools
+        logger.info("🎨 Steps 1-3: Generating image, uploading to GCS and validating...")
+        image_result = await generate_and_upload_image(
             student_writing=request.studentWriting,
             age_group=request.ageGroup,
             image_index=request.imageIndex,
             image_style=request.imageStyle,
-            submission_id=request.submissionId
-        )
-
-        if not image_result["success"]:
-            print(f"❌ Image generation failed: {image_result.get('error')}")
-            return JSONResponse(
-                status_code=500,
-                content={
-                    "success": False,
-                    "error": image_result.get("error", "Image generation failed"),
-                    "imageIndex": request.imageIndex
-                }
-            )
-
-        # Step 2: Upload to GCS using ADK tool
-        print(f"\n📤 Step 2: Uploading to GCS...")
-        upload_result = upload_image_to_gcs(
-            image_data=image_result["image_data"],
             submission_id=request.submissionId,
-            image_index=request.imageIndex,
-            file_format="png"
+            validate_safety=safety_enabled
         )
 
-        if not upload_result["success"]:
-            print(f"❌ Upload failed: {upload_result.get('error')}")
+        if not image_result["success"] and "safetyCheck" not in image_result:
+            logger.error("❌ Image generation failed: %s", image_result.get('error'))
             return JSONResponse(
                 status_code=500,
                 content={
                     "success": False,
-                    "error": upload_result.get("error", "Upload failed"),
+                    "error": image_result.get("error", "Image generation failed"),
                     "imageIndex": request.imageIndex
                 }
             )
 
-        image_url = upload_result["url"]
-        print(f"✅ Image uploaded: {image_url}")
-
-        # Step 3: Validate image safety (OPTIONAL - can enable/disable)
-        print(f"\n🛡️  Step 3: Image safety validation...")
-
-        # OPTION A: Enable safety validation
-        safety_enabled = os.getenv("ENABLE_IMAGE_SAFETY", "false").lower() == "true"
+        image_url = image_result["url"]
+        logger.info("✅ Image uploaded: %s", image_url)
 
         if safety_enabled:
-            safety_result = validate_image_safety(
-                image_url=image_url,
-                age_group=request.ageGroup,
-                context=request.studentWriting[:200]
-            )
+            safety_result = image_result["safetyCheck"]
 
             if not safety_result["isSafe"]:
-                print(f"⚠️  Image flagged as unsafe: {safety_result['riskLevel']}")
+                logger.warning("⚠️  Image flagged as unsafe: %s", safety_result['riskLevel'])
                 return JSONResponse(
                     status_code=200,
                     content={
@@ -273,21 +295,17 @@ async def generate_image(request: GenerateImageRequest):
                     }
                 )
 
-            print(f"✅ Image safety validated")
+            logger.info("✅ Image safety validated")
             safety_check = safety_result
         else:
             # OPTION B: Safety disabled (faster, for testing)
-            print(f"⏭️  Image safety validation disabled")
-            safety_check = {
-                "isSafe": True,
-                "riskLevel": "none",
-                "reasoning": "Safety validation disabled",
-                "timestamp": datetime.utcnow().isoformat()
-            }
+            logger.info("⏭️  Image safety validation disabled")
+            safety_check = dict(SAFETY_CHECK_DISABLED_TEMPLATE)
+            safety_check["timestamp"] = datetime.utcnow().isoformat()
 
         # Return success with image URL
         # Backend will create the database record
-        print(f"\n✅ Image generation complete\n")
+        logger.info("✅ Image generation complete")
 
         return {
             "success": True,
@@ -300,10 +318,8 @@ async def generate_image(request: GenerateImageRequest):
         }
 
     except Exception as e:
-        import traceback
-        error_trace = traceback.format_exc()
-        print(f"❌ Image generation error: {str(e)}")
-        print(f"   Stack trace:\n{error_trace}")
+        logger.exception("Image generation error")
+        error_trace = traceback.format_exc() if _IS_DEV else None
 
         return JSONResponse(
             status_code=500,
@@ -311,7 +327,7 @@ async def generate_image(request: GenerateImageRequest):
                 "success": False,
                 "error": str(e),
                 "imageIndex": request.imageIndex,
-                "details": error_trace if os.getenv("NODE_ENV") == "development" else str(e)
+                "details": error_trace or str(e)
             }
         )
 
@@ -323,7 +339,7 @@ async def generate_video(request: GenerateVideoRequest):
 
     This endpoint:
     1. Generates video from student writing
-    2. Uploads to Google Cloud Storage
+    2. Streams it into Google Cloud Storage
     3. Returns video URL
 
     Backend is responsible for:
@@ -332,13 +348,13 @@ async def generate_video(request: GenerateVideoRequest):
     - Verifying submission score
     """
     try:
-        print(f"\n🎬 Video Generation Request")
-        print(f"   Submission: {request.submissionId}")
-        print(f"   Style: {request.videoStyle}")
+        logger.info("🎬 Video Generation Request")
+        logger.info("Submission: %s", request.submissionId)
+        logger.info("Style: %s", request.videoStyle)
 
-        # Step 1: Generate video using ADK tool
-        print(f"\n🎬 Step 1: Generating video...")
-        video_result = generate_video_from_writing(
+        # Steps 1-2: Generate video and stream it to GCS using ADK tool
+        logger.info("🎬 Steps 1-2: Generating video and uploading to GCS...")
+        video_result = await generate_and_upload_video(
             student_writing=request.studentWriting,
             age_group=request.ageGroup,
             video_style=request.videoStyle,
@@ -346,7 +362,7 @@ async def generate_video(request: GenerateVideoRequest):
         )
 
         if not video_result["success"]:
-            print(f"❌ Video generation failed: {video_result.get('error')}")
+            logger.error("❌ Video generation failed: %s", video_result.get('error'))
             return JSONResponse(
                 status_code=500,
                 content={
@@ -355,30 +371,12 @@ async def generate_video(request: GenerateVideoRequest):
                 }
             )
 
-        # Step 2: Upload to GCS using ADK tool
-        print(f"\n📤 Step 2: Uploading video to GCS...")
-        upload_result = upload_video_to_gcs(
-            video_data=video_result["video_data"],
-            submission_id=request.submissionId,
-            file_format="mp4"
-        )
-
-        if not upload_result["success"]:
-            print(f"❌ Upload failed: {upload_result.get('error')}")
-            return JSONResponse(
-                status_code=500,
-                content={
-                    "success": False,
-                    "error": upload_result.get("error", "Upload failed")
-                }
-            )
-
-        video_url = upload_result["url"]
-        print(f"✅ Video uploaded: {video_url}")
+        video_url = video_result["url"]
+        logger.info("✅ Video uploaded: %s", video_url)
 
         # Return success with video URL
         # Backend will create the database record
-        print(f"\n✅ Video generation complete\n")
+        logger.info("✅ Video generation complete")
 
         return {
             "success": True,
@@ -391,17 +389,15 @@ async def generate_video(request: GenerateVideoRequest):
         }
 
     except Exception as e:
-        import traceback
-        error_trace = traceback.format_exc()
-        print(f"❌ Video generation error: {str(e)}")
-        print(f"   Stack trace:\n{error_trace}")
+        logger.exception("Video generation error")
+        error_trace = traceback.format_exc() if _IS_DEV else None
 
         return JSONResponse(
             status_code=500,
             content={
                 "success": False,
                 "error": str(e),
-                "details": error_trace if os.getenv("NODE_ENV") == "development" else str(e)
+                "details": error_trace or str(e)
             }
         )
 
@@ -419,7 +415,7 @@ async def validate_image(request: ValidateImageRequest):
         print(f"   Age Group: {request.ageGroup}")
 
         # Use ADK tool for validation
-        safety_result = validate_image_safety(
+        safety_result = await validate_image_safety(
             image_url=request.imageUrl,
             age_group=request.ageGroup,
             context=request.context or ""
@@ -3,11 +3,15 @@ Fun Writing AI Agents - Main Application
 Google ADK-based AI agents service with FastAPI
 """
 
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 from typing import Optional, List
+from contextlib import AsyncExitStack
+from types import MappingProxyType
 import os
+import logging
+import traceback
 import asyncio
 from datetime import datetime
 
@@ -22,6 +26,22 @@ from .agents.visual_media_agent import VisualMediaAgent
 from .services.database_service import DatabaseService
 from .services.gcs_storage_service import GCSStorageService
 
+logger = logging.getLogger(__name__)
+
+# Full stack traces are only returned to clients in development
+_IS_DEV = os.getenv("NODE_ENV") == "development"
+
+# Safety result reported when image validation is switched off
+SAFETY_CHECK_DISABLED_TEMPLATE = MappingProxyType({
+    "isSafe": True,
+    "riskLevel": "none",
+    "issues": (),
+    "recommendation": "approve",
+    "reasoning": "Safety check temporarily disabled for debugging",
+    "alertMessage": None,
+    "agent": "ImageSafetyAgent (disabled)"
+})
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Fun Writing AI Agents",
@@ -129,6 +149,18 @@ async def startup_event():
             print(f"   ℹ️  DB_HOST not set, skipping database initialization\n")
             db_service = None
 
+        # Agent names are static, so resolve them once for /health
+        app.state.agent_names = [
+            agent.get_info()["name"] if agent else "Not loaded"
+            for agent in (
+                content_safety_agent,
+                image_safety_agent,
+                prompt_agent,
+                feedback_agent,
+                visual_media_agent
+            )
+        ]
+
         print("✅ All agents and services initialized successfully!\n")
 
     except Exception as e:
@@ -147,9 +179,10 @@ async def shutdown_event():
 
 
 @app.get("/health")
-async def health_check():
+async def health_check(response: Response):
     """Health check endpoint."""
     db_healthy = await db_service.health_check() if db_service else False
+    response.headers["Cache-Control"] = "no-store, max-age=1"
 
     return {
         "status": "OK",
@@ -157,16 +190,22 @@ async def health_check():
         "framework": "Google ADK",
         "timestamp": datetime.utcnow().isoformat(),
         "database": "connected" if db_healthy else "disconnected",
-        "agents": [
-            content_safety_agent.get_info()["name"] if content_safety_agent else "Not loaded",
-            image_safety_agent.get_info()["name"] if image_safety_agent else "Not loaded",
-            prompt_agent.get_info()["name"] if prompt_agent else "Not loaded",
-            feedback_agent.get_info()["name"] if feedback_agent else "Not loaded",
-            visual_media_agent.get_info()["name"] if visual_media_agent else "Not loaded"
-        ]
+        "databasePool": db_service.pool_stats() if db_service else None,
+        "agents": getattr(app.state, "agent_names", [])
     }
 
 
+@app.get("/media-url")
+async def media_url(path: str):
+    """Return a read URL for a stored image or video (signed when SIGNED_URLS is on)."""
+    if not gcs_service:
+        raise HTTPException(status_code=503, detail="GCS storage not configured")
+    if not path.startswith(("images/", "videos/")) or ".." in path:
+        raise HTTPException(status_code=400, detail="Invalid media path")
+
+    return {"success": True, "url": await gcs_service.read_url(path)}
+
+
 @app.post("/analyze-writing")
 async def analyze_writing(request: AnalyzeWritingRequest):
     """
@@ -308,10 +347,10 @@ async def generate_image(request: GenerateImageRequest):
         if not gcs_service:
             raise HTTPException(status_code=503, detail="GCS storage not configured")
 
-        print(f"\n🖼️  Direct HTTP invoke: Generate {request.imageStyle} style image {request.imageIndex} for submission {request.submissionId}")
+        logger.info("🖼️  Direct HTTP invoke: Generate %s style image %s for submission %s", request.imageStyle, request.imageIndex, request.submissionId)
 
         # Step 1: Generate image prompt using ADK agent
-        print(f"   📝 Step 1: Generating image prompt...")
+        logger.info("📝 Step 1: Generating image prompt...")
         prompt = await visual_media_agent.generate_image_prompt(
             request.studentWriting,
             request.ageGroup,
@@ -323,82 +362,102 @@ async def generate_image(request: GenerateImageRequest):
         if not prompt or not isinstance(prompt, str):
             raise Exception(f"Invalid prompt returned: {type(prompt)}")
 
-        print(f"   Prompt: {prompt[:100]}..." if len(prompt) > 100 else f"   Prompt: {prompt}")
+        logger.info("Prompt: %.100s%s", prompt, "..." if len(prompt) > 100 else "")
 
         # Step 2: Generate image with Gemini 2.5 Flash Image using agent
-        print(f"   🎨 Step 2: Generating image with Gemini (via agent)...")
+        logger.info("🎨 Step 2: Generating image with Gemini (via agent)...")
         image_data = await visual_media_agent.generate_image_with_gemini(
             prompt,
             request.imageStyle
         )
 
-        # Step 3: Upload to GCS
-        print(f"   📤 Step 3: Uploading to GCS...")
-        image_url, file_name = await gcs_service.upload_image(
-            image_data,
-            request.submissionId,
-            request.imageIndex,
-            "png"  # Match Node.js implementation
-        )
-        print(f"   ✅ Uploaded: {image_url}")
-
-        # Step 4: Validate image safety (TEMPORARILY DISABLED)
-        print(f"   🛡️  Step 4: Validating image safety... (DISABLED)")
-        # TEMPORARY: Skip safety validation for debugging
-        # TODO: Re-enable after fixing safety agent
-        safety_check = {
-            "isSafe": True,
-            "riskLevel": "none",
-            "issues": [],
-            "recommendation": "approve",
-            "reasoning": "Safety check temporarily disabled for debugging",
-            "alertMessage": None,
-            "agent": "ImageSafetyAgent (disabled)",
-            "timestamp": datetime.utcnow().isoformat()
-        }
+        safety_enabled = os.getenv("ENABLE_IMAGE_SAFETY", "false").lower() == "true"
 
-        # Uncomment below to re-enable safety checking
-        # safety_check = await image_safety_agent.validate_image(
-        #     image_url,
-        #     request.ageGroup,
-        #     request.studentWriting[:200]
-        # )
-        #
-        # if not safety_check["isSafe"]:
-        #     print(f"   ⚠️  Image flagged as unsafe: {safety_check['riskLevel']}")
-        #     print(f"   Alert: {safety_check.get('alertMessage', 'Image contains inappropriate content')}")
-        #
-        #     # Return error but don't save to database
-        #     return JSONResponse(
-        #         status_code=200,
-        #         content={
-        #             "success": False,
-        #             "error": "Image failed safety validation",
-        #             "alertMessage": safety_check.get("alertMessage", "Generated image contains inappropriate content"),
-        #             "safetyCheck": safety_check,
-        #             "imageIndex": request.imageIndex
-        #         }
-        #     )
-
-        print(f"   ✅ Image safety check skipped (temporarily disabled)")
-
-        # Step 5: Save to database
-        print(f"   💾 Step 5: Saving to database...")
-        if db_service:
-            media_id = await db_service.create_media_record(
-                request.submissionId,
-                "image",
-                image_url,
-                file_name,
-                prompt,
-                request.userId
-            )
-            print(f"   ✅ Database record created: {media_id}")
-        else:
-            media_id = "no-db-configured"
-            print(f"   ⚠️  Database not configured, skipping save")
+        # Any failure past this point deletes the uploaded blob so GCS is not
+        # left with orphans; the compensation is dropped once the record is saved
+        async with AsyncExitStack() as stack:
+
+            async def upload():
+                url, name = await gcs_service.upload_image(
+                    image_data,
+                    request.submissionId,
+                    request.imageIndex,
+                    "png"  # Match Node.js implementation
+                )
+                stack.push_async_callback(gcs_service.delete_file, f"images/{name}")
+                return url, name
 
-        print(f"✅ {request.imageStyle} style image #{request.imageIndex} generated successfully\n")
+            # Steps 3 + 4: Upload to GCS while validating the generated bytes
+            logger.info("📤 Step 3: Uploading to GCS...")
+            try:
+                async with asyncio.TaskGroup() as tg:
+                    upload_task = tg.create_task(upload())
+                    if safety_enabled:
+                        logger.info("🛡️  Step 4: Validating image safety...")
+                        safety_task = tg.create_task(
+                            image_safety_agent.validate_image_bytes(
+                                image_data,
+                                request.ageGroup,
+                                request.studentWriting[:200]
+                            )
+                        )
+            except ExceptionGroup as eg:
+                # Report every failure, e.g. an upload error alongside a safety error
+                for error in eg.exceptions:
+                    logger.error("❌ Upload/safety step failed: %r", error)
+                raise HTTPException(
+                    status_code=500,
+                    detail="; ".join(str(error) for error in eg.exceptions)
+                ) from eg
+
+            image_url, file_name = upload_task.result()
+            logger.info("✅ Uploaded: %s", image_url)
+
+            if safety_enabled:
+                safety_check = {**safety_task.result(), "imageUrl": image_url}
+
+                if not safety_check["isSafe"]:
+                    logger.warning("⚠️  Image flagged as unsafe: %s", safety_check['riskLevel'])
+                    logger.warning("Alert: %s", safety_check.get('alertMessage', 'Image contains inappropriate content'))
+
+                    # Return error but don't save to database
+                    return JSONResponse(
+                        status_code=200,
+                        content={
+                            "success": False,
+                            "error": "Image failed safety validation",
+                            "alertMessage": safety_check.get("alertMessage", "Generated image contains inappropriate content"),
+                            "safetyCheck": safety_check,
+                            "imageIndex": request.imageIndex
+                        }
+                    )
+
+                logger.info("✅ Image safety validated")
+            else:
+                logger.info("⏭️  Step 4: Image safety validation disabled")
+                safety_check = dict(SAFETY_CHECK_DISABLED_TEMPLATE)
+                safety_check["timestamp"] = datetime.utcnow().isoformat()
+
+            # Step 5: Save to database
+            logger.info("💾 Step 5: Saving to database...")
+            if db_service:
+                media_id = await db_service.create_media_record(
+                    request.submissionId,
+                    "image",
+                    image_url,
+                    file_name,
+                    prompt,
+                    request.userId
+                )
+                logger.info("✅ Database record created: %s", media_id)
+            else:
+                media_id = "no-db-configured"
+                logger.warning("⚠️  Database not configured, skipping save")
+
+            # Everything succeeded, keep the uploaded blob
+            stack.pop_all()
+
+        logger.info("✅ %s style image #%s generated successfully", request.imageStyle, request.imageIndex)
 
         return {
             "success": True,
@@ -411,17 +470,15 @@ async def generate_image(request: GenerateImageRequest):
         }
 
     except Exception as e:
-        import traceback
-        error_trace = traceback.format_exc()
-        print(f"❌ Image generation error: {str(e)}")
-        print(f"   Stack trace:\n{error_trace}")
+        logger.exception("Image generation error")
+        error_trace = traceback.format_exc() if _IS_DEV else None
         return JSONResponse(
             status_code=500,
             content={
                 "success": False,
                 "error": str(e),
                 "imageIndex": request.imageIndex,
-                "details": error_trace if os.getenv("NODE_ENV") == "development" else str(e)
+                "details": error_trace or str(e)
             }
         )
 
@@ -481,11 +538,11 @@ async def generate_video(request: GenerateVideoRequest):
         if not gcs_service:
             raise HTTPException(status_code=503, detail="GCS storage not configured")
 
-        print(f"\n🎬 Video generation request - Mode: text-to-video, Style: {request.videoStyle}")
-        print(f"   Submission ID: {request.submissionId}")
+        logger.info("🎬 Video generation request - Mode: text-to-video, Style: %s", request.videoStyle)
+        logger.info("Submission ID: %s", request.submissionId)
 
         # Step 1: Generate video prompt using ADK agent
-        print(f"   📝 Step 1: Generating video prompt...")
+        logger.info("📝 Step 1: Generating video prompt...")
         video_prompt = await visual_media_agent.generate_video_prompt(
             request.studentWriting,
             request.ageGroup,
@@ -496,41 +553,46 @@ async def generate_video(request: GenerateVideoRequest):
         if not video_prompt or not isinstance(video_prompt, str):
             raise Exception(f"Invalid video prompt returned: {type(video_prompt)}")
 
-        print(f"   Prompt: {video_prompt[:100]}..." if len(video_prompt) > 100 else f"   Prompt: {video_prompt}")
+        logger.info("Prompt: %.100s%s", video_prompt, "..." if len(video_prompt) > 100 else "")
 
         # Step 2: Generate video with Veo 3.1 using agent
-        print(f"   🎬 Step 2: Generating video with Veo 3.1 (via agent)...")
+        logger.info("🎬 Step 2: Generating video with Veo 3.1 (via agent)...")
         video_data = await visual_media_agent.generate_video_with_veo(
             video_prompt,
             request.videoStyle
         )
 
-        # Step 3: Upload to GCS
-        print(f"   📤 Step 3: Uploading video to GCS...")
-        video_url, file_name = await gcs_service.upload_video(
-            video_data,
-            request.submissionId,
-            "mp4"
-        )
-        print(f"   ✅ Uploaded: {video_url}")
-
-        # Step 4: Save to database
-        print(f"   💾 Step 4: Saving to database...")
-        if db_service:
-            media_id = await db_service.create_media_record(
+        async with AsyncExitStack() as stack:
+            # Step 3: Upload to GCS
+            logger.info("📤 Step 3: Uploading video to GCS...")
+            video_url, file_name = await gcs_service.upload_video(
+                video_data,
                 request.submissionId,
-                "video",
-                video_url,
-                file_name,
-                video_prompt,
-                request.userId
+                "mp4"
             )
-            print(f"   ✅ Database record created: {media_id}")
-        else:
-            media_id = "no-db-configured"
-            print(f"   ⚠️  Database not configured, skipping save")
-
-        print(f"✅ {request.videoStyle} style video generated successfully\n")
+            stack.push_async_callback(gcs_service.delete_file, f"videos/{file_name}")
+            logger.info("✅ Uploaded: %s", video_url)
+
+            # Step 4: Save to database
+            logger.info("💾 Step 4: Saving to database...")
+            if db_service:
+                media_id = await db_service.create_media_record(
+                    request.submissionId,
+                    "video",
+                    video_url,
+                    file_name,
+                    video_prompt,
+                    request.userId
+                )
+                logger.info("✅ Database record created: %s", media_id)
+            else:
+                media_id = "no-db-configured"
+                logger.warning("⚠️  Database not configured, skipping save")
+
+            # Everything succeeded, keep the uploaded blob
+            stack.pop_all()
+
+        logger.info("✅ %s style video generated successfully", request.videoStyle)
 
         return {
             "success": True,
@@ -543,21 +605,20 @@ async def generate_video(request: GenerateVideoRequest):
         }
 
     except Exception as e:
-        import traceback
-        error_trace = traceback.format_exc()
-        print(f"❌ Video generation error: {str(e)}")
-        print(f"   Stack trace:\n{error_trace}")
+        logger.exception("Video generation error")
+        error_trace = traceback.format_exc() if _IS_DEV else None
         return JSONResponse(
             status_code=500,
             content={
                 "success": False,
                 "error": str(e),
-                "details": error_trace if os.getenv("NODE_ENV") == "development" else str(e)
+                "details": error_trace or str(e)
             }
         )
 
 
 if __name__ == "__main__":
     import uvicorn
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper())
     port = int(os.getenv("PORT", 8080))
     uvicorn.run(app, host="0.0.0.0", port=port)
@@ -3,6 +3,8 @@ Writing Assistant Orchestrator - Main ADK Agent
 Coordinates all writing-related operations using Google ADK
 """
 
+import string
+
 from google.adk.agents import LlmAgent
 from .tools import (
     check_content_safety,
@@ -17,25 +19,9 @@ from .tools import (
 )
 
 
-class WritingAssistantOrchestrator:
-    """
-    Main orchestration agent for Fun Writing AI platform.
-
-    This agent coordinates all writing-related operations including:
-    - Student writing analysis and feedback
-    - AI image and video generation
-    - Content and media safety validation
-    - Database and storage operations
-    """
+_ORCHESTRATOR_MODEL = "gemini-2.5-flash"
 
-    def __init__(self):
-        self.name = "WritingAssistantOrchestrator"
-
-        # Initialize the ADK agent with all tools
-        self.agent = LlmAgent(
-            name="WritingAssistantOrchestrator",
-            model="gemini-2.5-flash",
-            instruction="""You are an AI orchestrator for a children's writing platform called Fun Writing.
+_ORCHESTRATOR_INSTRUCTION = """You are an AI orchestrator for a children's writing platform called Fun Writing.
 
 Your responsibilities:
 1. Analyze student writing and provide detailed, encouraging feedback
@@ -73,18 +59,96 @@ Always prioritize:
 - Positive, constructive feedback
 - Fun and engaging creative expression
 
-Be specific, enthusiastic, and helpful in all interactions.""",
-            tools=[
-                check_content_safety,
-                analyze_student_writing,
-                generate_image_from_writing,
-                generate_video_from_writing,
-                upload_image_to_gcs,
-                upload_video_to_gcs,
-                save_submission_feedback,
-                create_media_record,
-                validate_image_safety
-            ]
+Be specific, enthusiastic, and helpful in all interactions."""
+
+_ORCHESTRATOR_TOOLS = (
+    check_content_safety,
+    analyze_student_writing,
+    generate_image_from_writing,
+    generate_video_from_writing,
+    upload_image_to_gcs,
+    upload_video_to_gcs,
+    save_submission_feedback,
+    create_media_record,
+    validate_image_safety
+)
+
+# Per-call request templates, compiled once at import
+_ANALYZE_TMPL = string.Template("""Analyze this student writing submission:
+
+Submission ID: $submission_id
+User ID: $user_id
+Age Group: $age_group
+
+Original Prompt: "$original_prompt"
+
+Student Writing:
+"$student_writing"
+
+Please:
+1. Check if the content is safe and age-appropriate
+2. If safe, analyze the writing and provide detailed feedback
+3. Save the feedback to the database
+
+Return the complete feedback with scores.""")
+
+_GENERATE_IMAGE_TMPL = string.Template("""Generate an image from this student story:
+
+Submission ID: $submission_id
+User ID: $user_id
+Age Group: $age_group
+Image Index: $image_index
+Image Style: $image_style
+
+Student Writing:
+"$student_writing"
+
+Please:
+1. Generate an image using the specified style and index
+2. Upload the image to Google Cloud Storage
+3. Validate the image for safety
+4. If safe, save the media record to the database
+5. Return the image URL and metadata
+
+If the image is unsafe, do not save it and explain why.""")
+
+_GENERATE_VIDEO_TMPL = string.Template("""Generate a video from this student story:
+
+Submission ID: $submission_id
+User ID: $user_id
+Age Group: $age_group
+Video Style: $video_style
+
+Student Writing:
+"$student_writing"
+
+Please:
+1. Generate a video using the specified style
+2. Upload the video to Google Cloud Storage
+3. Save the media record to the database
+4. Return the video URL and metadata""")
+
+
+class WritingAssistantOrchestrator:
+    """
+    Main orchestration agent for Fun Writing AI platform.
+
+    This agent coordinates all writing-related operations including:
+    - Student writing analysis and feedback
+    - AI image and video generation
+    - Content and media safety validation
+    - Database and storage operations
+    """
+
+    def __init__(self):
+        self.name = "WritingAssistantOrchestrator"
+
+        # Initialize the ADK agent with all tools
+        self.agent = LlmAgent(
+            name="WritingAssistantOrchestrator",
+            model=_ORCHESTRATOR_MODEL,
+            instruction=_ORCHESTRATOR_INSTRUCTION,
+            tools=list(_ORCHESTRATOR_TOOLS)
         )
 
     async def analyze_writing(
@@ -108,23 +172,13 @@ Be specific, enthusiastic, and helpful in all interactions.""",
         Returns:
             dict: Analysis result with feedback and safety check
         """
-        request = f"""Analyze this student writing submission:
-
-Submission ID: {submission_id}
-User ID: {user_id}
-Age Group: {age_group}
-
-Original Prompt: "{original_prompt}"
-
-Student Writing:
-"{student_writing}"
-
-Please:
-1. Check if the content is safe and age-appropriate
-2. If safe, analyze the writing and provide detailed feedback
-3. Save the feedback to the database
-
-Return the complete feedback with scores."""
+        request = _ANALYZE_TMPL.substitute(
+            submission_id=submission_id,
+            user_id=user_id,
+            age_group=age_group,
+            original_prompt=original_prompt,
+            student_writing=student_writing
+        )
 
         response = await self.agent.run(request)
         return self._parse_response(response)
@@ -152,25 +206,14 @@ Return the complete feedback with scores."""
         Returns:
             dict: Generation result with image URL and metadata
         """
-        request = f"""Generate an image from this student story:
-
-Submission ID: {submission_id}
-User ID: {user_id}
-Age Group: {age_group}
-Image Index: {image_index}
-Image Style: {image_style}
-
-Student Writing:
-"{student_writing}"
-
-Please:
-1. Generate an image using the specified style and index
-2. Upload the image to Google Cloud Storage
-3. Validate the image for safety
-4. If safe, save the media record to the database
-5. Return the image URL and metadata
-
-If the image is unsafe, do not save it and explain why."""
+        request = _GENERATE_IMAGE_TMPL.substitute(
+            submission_id=submission_id,
+            user_id=user_id,
+            age_group=age_group,
+            image_index=image_index,
+            image_style=image_style,
+            student_writing=student_writing
+        )
 
         response = await self.agent.run(request)
         return self._parse_response(response)
@@ -196,38 +239,50 @@ If the image is unsafe, do not save it and explain why."""
         Returns:
             dict: Generation result with video URL and metadata
         """
-        request = f"""Generate a video from this student story:
-
-Submission ID: {submission_id}
-User ID: {user_id}
-Age Group: {age_group}
-Video Style: {video_style}
-
-Student Writing:
-"{student_writing}"
-
-Please:
-1. Generate a video using the specified style
-2. Upload the video to Google Cloud Storage
-3. Save the media record to the database
-4. Return the video URL and metadata"""
+        request = _GENERATE_VIDEO_TMPL.substitute(
+            submission_id=submission_id,
+            user_id=user_id,
+            age_group=age_group,
+            video_style=video_style,
+            student_writing=student_writing
+        )
 
         response = await self.agent.run(request)
         return self._parse_response(response)
 
     def _parse_response(self, response) -> dict:
-        """Parse agent response into structured format."""
+        """
+        Parse agent response into structured format.
+
+        Walks the response parts and keeps only the tool call arguments and
+        the first text part, so large responses are never stringified.
+        """
         try:
-            # The agent response should already be structured
-            # This is a placeholder for response parsing logic
-            if hasattr(response, 'content'):
+            content = getattr(response, 'content', None)
+            if isinstance(content, str):
                 return {
                     "success": True,
-                    "response": response.content
+                    "response": content
                 }
+
+            parts = getattr(response, 'parts', None) or getattr(content, 'parts', None)
+            if parts:
+                return {
+                    "success": True,
+                    "tool_calls": [
+                        part.function_call.args
+                        for part in parts
+                        if getattr(part, 'function_call', None)
+                    ],
+                    "text": next(
+                        (part.text for part in parts if getattr(part, 'text', None)),
+                        None
+                    )
+                }
+
             return {
-                "success": True,
-                "response": str(response)
+                "success": False,
+                "error": "unparseable"
             }
         except Exception as e:
             return {
@@ -240,19 +295,9 @@ Please:
         return {
             "name": self.name,
             "framework": "Google ADK",
-            "model": "gemini-2.5-flash",
+            "model": _ORCHESTRATOR_MODEL,
             "description": "Main orchestration agent for Fun Writing platform",
-            "tools": [
-                "check_content_safety",
-                "analyze_student_writing",
-                "generate_image_from_writing",
-                "generate_video_from_writing",
-                "upload_image_to_gcs",
-                "upload_video_to_gcs",
-                "save_submission_feedback",
-                "create_media_record",
-                "validate_image_safety"
-            ],
+            "tools": [tool.__name__ for tool in _ORCHESTRATOR_TOOLS],
             "capabilities": [
                 "Student writing analysis and feedback",
                 "AI image generation with Gemini 2.5 Flash Image",
@@ -3,18 +3,54 @@ Database Service for Python ADK Agents
 Handles Cloud SQL PostgreSQL operations
 """
 
-import psycopg2
-from psycopg2.extras import RealDictCursor
+import asyncpg
+import logging
 import os
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Tuple
 import json
 
+logger = logging.getLogger(__name__)
+
+# asyncpg prepares every statement server-side and caches the plan per
+# connection keyed by query text, so keep the SQL in stable module constants
+_UPDATE_FEEDBACK_SQL = """
+    UPDATE "WritingSubmissions"
+    SET feedback = $1,
+        score = $2,
+        status = $3,
+        updated_at = NOW()
+    WHERE id = $4
+"""
+
+_INSERT_MEDIA_COLUMNS = (
+    'id, submission_id, user_id, media_type, "imageUrl", "videoUrl", '
+    'file_name, prompt, generation_status, created_at'
+)
+
+# One statement for both media types; the unused URL column is bound to NULL
+_INSERT_MEDIA_SQL = f"""
+    INSERT INTO "GeneratedMedia"
+    ({_INSERT_MEDIA_COLUMNS})
+    VALUES (gen_random_uuid(), $1, $2, $3, $4, $5, $6, $7, 'completed', NOW())
+    RETURNING id
+"""
+
+
+async def _init_connection(conn: asyncpg.Connection):
+    """Encode/decode jsonb as Python objects so dicts bind directly."""
+    await conn.set_type_codec(
+        "jsonb",
+        encoder=json.dumps,
+        decoder=json.loads,
+        schema="pg_catalog"
+    )
+
 
 class DatabaseService:
     """Service for interacting with Cloud SQL PostgreSQL database."""
 
     def __init__(self):
-        self.connection = None
+        self.pool: Optional[asyncpg.Pool] = None
         # Use simplified environment variables
         # For Cloud Run, database connection will be configured in deployment
         self.db_config = {
@@ -24,35 +60,59 @@ class DatabaseService:
             "user": os.getenv("DB_USER", "postgres"),
             "password": os.getenv("DB_PASSWORD", "")
         }
+        # Cloud SQL handles ~(cores * 2) + spindles active backends well
+        self.pool_min_size = int(os.getenv("DB_POOL_MIN", 2))
+        self.pool_max_size = int(os.getenv("DB_POOL_SIZE", 10))
+        # Set to 0 when connecting through a transaction-mode pooler (PgBouncer)
+        self.statement_cache_size = int(os.getenv("DB_STATEMENT_CACHE_SIZE", 100))
 
     async def connect(self):
-        """Establish database connection."""
+        """Create the database connection pool."""
         try:
-            self.connection = psycopg2.connect(**self.db_config)
-            print(f"✅ Database connected: {self.db_config['database']}")
-        except Exception as e:
-            print(f"❌ Database connection error: {str(e)}")
+            self.pool = await asyncpg.create_pool(
+                **self.db_config,
+                min_size=self.pool_min_size,
+                max_size=self.pool_max_size,
+                statement_cache_size=self.statement_cache_size,
+                command_timeout=30,
+                init=_init_connection
+            )
+            logger.info("✅ Database connected: %s", self.db_config['database'])
+        except Exception:
+            logger.exception("Database connection error")
             raise
 
     async def disconnect(self):
-        """Close database connection."""
-        if self.connection:
-            self.connection.close()
-            print("✅ Database disconnected")
+        """Close the database connection pool."""
+        if self.pool:
+            await self.pool.close()
+            self.pool = None
+            logger.info("✅ Database disconnected")
 
     async def health_check(self) -> bool:
         """Check database health."""
         try:
-            if not self.connection:
+            if not self.pool:
                 return False
 
-            cursor = self.connection.cursor()
-            cursor.execute("SELECT 1")
-            cursor.close()
+            async with self.pool.acquire() as conn:
+                await conn.fetchval("SELECT 1")
             return True
         except Exception:
             return False
 
+    def pool_stats(self) -> Dict[str, Any]:
+        """Get connection pool usage."""
+        if not self.pool:
+            return {"size": 0, "idle": 0, "min": self.pool_min_size, "max": self.pool_max_size}
+
+        return {
+            "size": self.pool.get_size(),
+            "idle": self.pool.get_idle_size(),
+            "min": self.pool.get_min_size(),
+            "max": self.pool.get_max_size()
+        }
+
     async def update_submission_feedback(
         self,
         submission_id: str,
@@ -61,27 +121,49 @@ class DatabaseService:
     ):
         """Update submission with feedback and score."""
         try:
-            cursor = self.connection.cursor()
-
-            query = """
-                UPDATE "WritingSubmissions"
-                SET feedback = %s,
-                    score = %s,
-                    status = 'feedback_complete',
-                    updated_at = NOW()
-                WHERE id = %s
-            """
+            async with self.pool.acquire() as conn:
+                await conn.execute(
+                    _UPDATE_FEEDBACK_SQL,
+                    feedback,
+                    score,
+                    'feedback_complete',
+                    submission_id
+                )
+
+            logger.info("✅ Feedback saved for submission: %s", submission_id)
+
+        except Exception:
+            logger.exception("Failed to save feedback")
+            raise
+
+    async def update_submission_feedback_many(
+        self,
+        items: List[Tuple[str, Dict[str, Any], int]]
+    ):
+        """
+        Update many submissions with feedback and score in one batch.
 
-            cursor.execute(query, (json.dumps(feedback), score, submission_id))
-            self.connection.commit()
-            cursor.close()
+        Args:
+            items: (submission_id, feedback, score) tuples
+        """
+        if not items:
+            return
 
-            print(f"✅ Feedback saved for submission: {submission_id}")
+        try:
+            async with self.pool.acquire() as conn:
+                async with conn.transaction():
+                    await conn.executemany(
+                        _UPDATE_FEEDBACK_SQL,
+                        [
+                            (feedback, score, 'feedback_complete', submission_id)
+                            for submission_id, feedback, score in items
+                        ]
+                    )
+
+            logger.info("✅ Feedback saved for %s submissions", len(items))
 
-        except Exception as e:
-            print(f"❌ Failed to save feedback: {str(e)}")
-            if self.connection:
-                self.connection.rollback()
+        except Exception:
+            logger.exception("Failed to save feedback batch")
             raise
 
     async def create_media_record(
@@ -95,37 +177,77 @@ class DatabaseService:
     ) -> str:
         """Create a generated media record."""
         try:
-            cursor = self.connection.cursor(cursor_factory=RealDictCursor)
-
             # Set imageUrl or videoUrl depending on type
-            if media_type == 'image':
-                query = """
-                    INSERT INTO "GeneratedMedia"
-                    (id, submission_id, user_id, media_type, "imageUrl", gcs_url, file_name, prompt, generation_status, created_at)
-                    VALUES (gen_random_uuid(), %s, %s, %s, %s, %s, %s, %s, 'completed', NOW())
-                    RETURNING id
-                """
-                cursor.execute(query, (submission_id, user_id, media_type, gcs_url, gcs_url, file_name, prompt))
-            else:  # video
-                query = """
-                    INSERT INTO "GeneratedMedia"
-                    (id, submission_id, user_id, media_type, "videoUrl", gcs_url, file_name, prompt, generation_status, created_at)
-                    VALUES (gen_random_uuid(), %s, %s, %s, %s, %s, %s, %s, 'completed', NOW())
-                    RETURNING id
-                """
-                cursor.execute(query, (submission_id, user_id, media_type, gcs_url, gcs_url, file_name, prompt))
-
-            result = cursor.fetchone()
-            self.connection.commit()
-
-            media_id = result["id"] if result else None
-            cursor.close()
-
-            print(f"✅ Media record created: {media_id}")
+            async with self.pool.acquire() as conn:
+                media_id = await conn.fetchval(
+                    _INSERT_MEDIA_SQL,
+                    submission_id,
+                    user_id,
+                    media_type,
+                    gcs_url if media_type == 'image' else None,
+                    gcs_url if media_type != 'image' else None,
+                    file_name,
+                    prompt
+                )
+            media_id = str(media_id) if media_id else None
+
+            logger.info("✅ Media record created: %s", media_id)
             return media_id
 
-        except Exception as e:
-            print(f"❌ Failed to create media record: {str(e)}")
-            if self.connection:
-                self.connection.rollback()
+        except Exception:
+            logger.exception("Failed to create media record")
+            raise
+
+    async def create_media_records_many(
+        self,
+        records: List[Tuple[str, str, str, str, Optional[str], Optional[str]]]
+    ) -> List[str]:
+        """
+        Create several generated media records with a single INSERT.
+
+        Args:
+            records: (submission_id, media_type, gcs_url, file_name, prompt, user_id)
+                tuples, in the same order as create_media_record's arguments
+
+        Returns:
+            Created media IDs, in the same order as records
+        """
+        if not records:
+            return []
+
+        try:
+            values = []
+            params = []
+            for submission_id, media_type, gcs_url, file_name, prompt, user_id in records:
+                n = len(params)
+                values.append(
+                    f"(gen_random_uuid(), ${n + 1}, ${n + 2}, ${n + 3}, ${n + 4}, ${n + 5}, "
+                    f"${n + 6}, ${n + 7}, 'completed', NOW())"
+                )
+                params.extend([
+                    submission_id,
+                    user_id,
+                    media_type,
+                    gcs_url if media_type == 'image' else None,
+                    gcs_url if media_type != 'image' else None,
+                    file_name,
+                    prompt
+                ])
+
+            query = f"""
+                INSERT INTO "GeneratedMedia"
+                ({_INSERT_MEDIA_COLUMNS})
+                VALUES {", ".join(values)}
+                RETURNING id
+            """
+
+            async with self.pool.acquire() as conn:
+                rows = await conn.fetch(query, *params)
+            media_ids = [str(row["id"]) for row in rows]
+
+            logger.info("✅ Media records created: %s", len(media_ids))
+            return media_ids
+
+        except Exception:
+            logger.exception("Failed to create media records")
             raise
@@ -3,12 +3,53 @@ GCS Storage Service for Python ADK Agents
 Handles Google Cloud Storage operations for media files
 """
 
+import google.auth
+from google.auth.transport.requests import Request as AuthRequest
 from google.cloud import storage
+from google.cloud.storage import transfer_manager
+from google.cloud.storage.retry import DEFAULT_RETRY
+from requests.adapters import HTTPAdapter
+import asyncio
+import io
+import logging
 import os
-from typing import Tuple
+import threading
+from typing import Dict, List, Optional, Tuple
 import uuid
 from datetime import timedelta
 
+logger = logging.getLogger(__name__)
+
+# Resumable upload chunks must be a multiple of 256 KiB
+_CHUNK_ALIGNMENT = 256 * 1024
+
+# Process-wide client and bucket handles, shared so every upload reuses the
+# same authorized HTTP session instead of paying for a new TLS handshake
+_CLIENT: Optional[storage.Client] = None
+_BUCKETS: Dict[str, storage.Bucket] = {}
+_LOCK = threading.Lock()
+
+# Enough pooled connections for concurrent uploads and transfer_manager workers
+_HTTP_POOL_SIZE = 32
+
+
+def _get_bucket(bucket_name: str, project_id: Optional[str]) -> storage.Bucket:
+    """Return the shared bucket handle, creating the client on first use."""
+    global _CLIENT
+
+    with _LOCK:
+        if _CLIENT is None:
+            _CLIENT = storage.Client(project=project_id) if project_id else storage.Client()
+            _CLIENT._http.mount(
+                "https://",
+                HTTPAdapter(pool_connections=_HTTP_POOL_SIZE, pool_maxsize=_HTTP_POOL_SIZE)
+            )
+
+        if bucket_name not in _BUCKETS:
+            _BUCKETS[bucket_name] = _CLIENT.bucket(bucket_name)
+
+        return _BUCKETS[bucket_name]
+
 
 class GCSStorageService:
     """Service for uploading media files to Google Cloud Storage."""
@@ -20,13 +61,26 @@ class GCSStorageService:
 
         # Use project from environment
         project_id = os.getenv("GCP_PROJECT_ID")
-        self.client = storage.Client(project=project_id) if project_id else storage.Client()
-        self.bucket = self.client.bucket(self.bucket_name)
+        self.bucket = _get_bucket(self.bucket_name, project_id)
+        self.client = self.bucket.client
+
+        # Chunk size for resumable video uploads
+        chunk_size = int(os.getenv("GCS_CHUNK_SIZE", 8 * 1024 * 1024))
+        self.chunk_size = max(_CHUNK_ALIGNMENT, chunk_size - chunk_size % _CHUNK_ALIGNMENT)
+
+        # Worker threads for multi-object uploads
+        self.max_workers = int(os.getenv("GCS_MAX_WORKERS", 8))
+
+        # Uploads always return the permanent public URL, which is what gets
+        # stored. With SIGNED_URLS=true, read_url() hands out short-lived V4
+        # signed URLs at read time instead
+        self.signed_urls = os.getenv("SIGNED_URLS", "false").lower() == "true"
+        self.signed_url_minutes = int(os.getenv("SIGNED_URL_MINUTES", 60))
 
     async def bucket_exists(self) -> bool:
         """Check if bucket exists."""
         try:
-            return self.bucket.exists()
+            return await asyncio.to_thread(self.bucket.exists)
         except Exception:
             return False
 
@@ -49,33 +103,109 @@ class GCSStorageService:
         Returns:
             Tuple of (public_url, file_name)
         """
+        return await asyncio.to_thread(
+            self._upload_image_sync, image_data, submission_id, image_index, extension
+        )
+
+    async def upload_images(
+        self,
+        items: List[Tuple[bytes, str, int, str]],
+        concurrency: int = 8
+    ) -> List[Tuple[str, str]]:
+        """
+        Upload several images to GCS concurrently.
+
+        Args:
+            items: (image_data, submission_id, image_index, extension) tuples
+            concurrency: Maximum number of uploads in flight
+
+        Returns:
+            List of (public_url, file_name) tuples, in the same order as items
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def upload_one(args):
+            async with semaphore:
+                return await asyncio.to_thread(self._upload_image_sync, *args)
+
+        return await asyncio.gather(*(upload_one(args) for args in items))
+
+    async def upload_many_images(
+        self,
+        items: List[Tuple[bytes, str, int, str]]
+    ) -> List[Tuple[str, str]]:
+        """
+        Upload several images to GCS with the transfer manager worker pool.
+
+        Args:
+            items: (image_data, submission_id, image_index, extension) tuples
+
+        Returns:
+            List of (public_url, file_name) tuples, in the same order as items
+        """
         try:
-            print(f"   📦 Preparing upload: {len(image_data)} bytes of image data")
-            print(f"   📍 Bucket: {self.bucket_name}")
+            file_names = []
+            file_blob_pairs = []
+            for image_data, submission_id, image_index, extension in items:
+                file_name = self._image_file_name(submission_id, image_index, extension)
+                blob = self.bucket.blob(f"images/{file_name}")
+                blob.content_type = f"image/{extension}"
+                file_names.append(file_name)
+                file_blob_pairs.append((io.BytesIO(image_data), blob))
 
-            unique_id = str(uuid.uuid4())[:8]
-            file_name = f"{submission_id}_{unique_id}_{image_index}.{extension}"
+            logger.info("📦 Uploading %s images to %s", len(items), self.bucket_name)
+
+            results = await asyncio.to_thread(
+                transfer_manager.upload_many,
+                file_blob_pairs,
+                max_workers=self.max_workers,
+                worker_type=transfer_manager.THREAD
+            )
+            for result in results:
+                if isinstance(result, Exception):
+                    raise result
+
+            blobs = [blob for _, blob in file_blob_pairs]
+
+            logger.info("✅ %s images uploaded", len(blobs))
+            return [(self._public_url(blob), file_name) for blob, file_name in zip(blobs, file_names)]
+
+        except Exception:
+            logger.exception("Failed to upload images")
+            raise
+
+    def _image_file_name(self, submission_id: str, image_index: int, extension: str) -> str:
+        """Build a unique image file name."""
+        unique_id = str(uuid.uuid4())[:8]
+        return f"{submission_id}_{unique_id}_{image_index}.{extension}"
+
+    def _upload_image_sync(
+        self,
+        image_data: bytes,
+        submission_id: str,
+        image_index: int,
+        extension: str
+    ) -> Tuple[str, str]:
+        """Blocking image upload, run in a worker thread."""
+        try:
+            logger.debug("📦 Preparing upload: %s bytes of image data", len(image_data))
+            logger.debug("📍 Bucket: %s", self.bucket_name)
+
+            file_name = self._image_file_name(submission_id, image_index, extension)
             blob_name = f"images/{file_name}"
 
-            print(f"   📄 File name: {blob_name}")
+            logger.debug("📄 File name: %s", blob_name)
 
             blob = self.bucket.blob(blob_name)
             blob.upload_from_string(image_data, content_type=f"image/{extension}")
 
-            print(f"   ✅ Upload complete, making public...")
-
-            # Make public
-            blob.make_public()
-
-            public_url = blob.public_url
-            print(f"✅ Image uploaded: {public_url}")
+            public_url = self._public_url(blob)
+            logger.info("✅ Image uploaded: %s", public_url)
 
             return public_url, file_name
 
-        except Exception as e:
-            import traceback
-            print(f"❌ Failed to upload image: {str(e)}")
-            print(f"   Stack trace:\n{traceback.format_exc()}")
+        except Exception:
+            logger.exception("Failed to upload image")
             raise
 
     async def upload_video(
@@ -95,31 +225,95 @@ class GCSStorageService:
         Returns:
             Tuple of (public_url, file_name)
         """
+        return await asyncio.to_thread(
+            self._upload_video_sync, video_data, submission_id, extension
+        )
+
+    def _upload_video_sync(
+        self,
+        video_data: bytes,
+        submission_id: str,
+        extension: str
+    ) -> Tuple[str, str]:
+        """Blocking video upload, run in a worker thread."""
         try:
-            print(f"   📦 Preparing upload: {len(video_data)} bytes of video data")
-            print(f"   📍 Bucket: {self.bucket_name}")
+            logger.debug("📦 Preparing upload: %s bytes of video data", len(video_data))
+            logger.debug("📍 Bucket: %s", self.bucket_name)
 
             unique_id = str(uuid.uuid4())[:8]
             file_name = f"{submission_id}_{unique_id}.{extension}"
             blob_name = f"videos/{file_name}"
 
-            print(f"   📄 File name: {blob_name}")
+            logger.debug("📄 File name: %s", blob_name)
 
-            blob = self.bucket.blob(blob_name)
-            blob.upload_from_string(video_data, content_type=f"video/{extension}")
+            # Resumable upload in chunk_size pieces, retrying failed chunks
+            blob = self.bucket.blob(blob_name, chunk_size=self.chunk_size)
+            blob.upload_from_file(
+                io.BytesIO(video_data),
+                size=len(video_data),
+                content_type=f"video/{extension}",
+                retry=DEFAULT_RETRY
+            )
 
-            print(f"   ✅ Upload complete, making public...")
+            public_url = self._public_url(blob)
+            logger.info("✅ Video uploaded: %s", public_url)
 
-            # Make public
-            blob.make_public()
+            return public_url, file_name
 
-            public_url = blob.public_url
-            print(f"✅ Video uploaded: {public_url}")
+        except Exception:
+            logger.exception("Failed to upload video")
+            raise
 
-            return public_url, file_name
+    def _public_url(self, blob: storage.Blob) -> str:
+        """Build the permanent storage URL for a blob (no ACL change)."""
+        return f"https://storage.googleapis.com/{self.bucket_name}/{blob.name}"
 
+    async def read_url(self, blob_name: str) -> str:
+        """
+        Return the URL a client should use to read a blob right now.
+
+        Args:
+            blob_name: Full blob path (e.g. "images/<file_name>")
+
+        Returns:
+            A V4 signed URL when SIGNED_URLS is enabled, otherwise the public URL
+        """
+        blob = self.bucket.blob(blob_name)
+        if not self.signed_urls:
+            return self._public_url(blob)
+        return await asyncio.to_thread(self._signed_url_sync, blob)
+
+    def _signed_url_sync(self, blob: storage.Blob) -> str:
+        """Blocking URL signing, run in a worker thread."""
+        # Cloud Run credentials carry no private key, so the URL is signed
+        # through the IAM signBlob API using the service account's token
+        credentials, _ = google.auth.default()
+        credentials.refresh(AuthRequest())
+
+        return blob.generate_signed_url(
+            version="v4",
+            expiration=timedelta(minutes=self.signed_url_minutes),
+            method="GET",
+            service_account_email=credentials.service_account_email,
+            access_token=credentials.token
+        )
+
+    async def delete_file(self, blob_name: str) -> bool:
+        """
+        Delete an uploaded file from GCS.
+
+        Used to clean up blobs left behind when a later step fails.
+
+        Args:
+            blob_name: Full blob path (e.g. "images/<file_name>")
+
+        Returns:
+            True if the blob was deleted, False otherwise
+        """
+        try:
+            await asyncio.to_thread(self.bucket.blob(blob_name).delete)
+            logger.info("🗑️  Deleted orphaned blob: %s", blob_name)
+            return True
         except Exception as e:
-            import traceback
-            print(f"❌ Failed to upload video: {str(e)}")
-            print(f"   Stack trace:\n{traceback.format_exc()}")
-            raise
+            logger.warning("⚠️  Failed to delete blob %s: %s", blob_name, e)
+            return False
@@ -47,20 +47,32 @@ def main():
         print("📦 Loading uvicorn...")
         import uvicorn
 
-        # Import the app
-        print("📦 Loading FastAPI application...")
-        from python_agents.main import app
+        # One worker by default: os.cpu_count() reports the host's cores, not
+        # the container's vCPU limit, and every worker opens its own DB pool
+        workers = int(os.getenv("WEB_CONCURRENCY", 1))
 
-        print(f"🌐 Starting server on 0.0.0.0:{port}...")
+        if workers == 1:
+            # Single process: load the app here so import errors surface early
+            print("📦 Loading FastAPI application...")
+            from python_agents.main import app
+        else:
+            # Each worker process imports the app itself
+            app = "python_agents.main:app"
+
+        print(f"🌐 Starting server on 0.0.0.0:{port} ({workers} workers)...")
         print(f"📊 Health check will be available at: http://0.0.0.0:{port}/health\n")
 
-        # Start uvicorn
+        # Start uvicorn with the libuv event loop and C HTTP parser
         uvicorn.run(
             app,
             host="0.0.0.0",
             port=int(port),
-            log_level="info",
-            access_log=True
+            loop="uvloop",
+            http="httptools",
+            workers=workers,
+            log_level=os.getenv("LOG_LEVEL", "info").lower(),
+            # Cloud Run already records every request, so app access logs are opt-in
+            access_log=os.getenv("UVICORN_ACCESS_LOG", "false").lower() == "true"
         )
 
     except ImportError as e:
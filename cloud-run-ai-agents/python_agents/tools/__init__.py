@@ -3,21 +3,35 @@ Fun Writing AI Agents - Custom ADK Tools
 """
 
 from .content_safety_tool import check_content_safety
-from .feedback_tool import analyze_student_writing
-from .image_generation_tool import generate_image_from_writing
-from .video_generation_tool import generate_video_from_writing
-from .gcs_storage_tool import upload_image_to_gcs, upload_video_to_gcs
+from .feedback_tool import analyze_student_writing, analyze_student_writing_batch
+from .image_generation_tool import (
+    generate_image_from_writing,
+    generate_and_upload_image,
+    generate_images_for_submission
+)
+from .video_generation_tool import generate_video_from_writing, generate_and_upload_video
+from .gcs_storage_tool import (
+    upload_image_to_gcs,
+    upload_video_to_gcs,
+    upload_video_stream_to_gcs
+)
 from .database_tool import save_submission_feedback, create_media_record
-from .image_safety_tool import validate_image_safety
+from .image_safety_tool import validate_image_safety, validate_image_bytes
 
 __all__ = [
     'check_content_safety',
     'analyze_student_writing',
+    'analyze_student_writing_batch',
     'generate_image_from_writing',
+    'generate_and_upload_image',
+    'generate_images_for_submission',
     'generate_video_from_writing',
+    'generate_and_upload_video',
     'upload_image_to_gcs',
     'upload_video_to_gcs',
+    'upload_video_stream_to_gcs',
     'save_submission_feedback',
     'create_media_record',
     'validate_image_safety',
+    'validate_image_bytes',
 ]
@@ -4,54 +4,24 @@ Content Safety Tool - Validates text content for safety and appropriateness
 
 import google.generativeai as genai
 import os
+import logging
 import json
+import re
+import asyncio
 from datetime import datetime
+from types import MappingProxyType
+from typing import List, TypedDict
 
+from ..gemini_config import require_api_key
+from .json_response import parse_json_response
+from .result_cache import InFlight, TTLCache, cache_key
 
-def check_content_safety(
-    content: str,
-    age_group: str,
-    user_id: str
-) -> dict:
-    """
-    Check if content is safe and age-appropriate using Gemini.
+logger = logging.getLogger(__name__)
 
-    This tool analyzes text content for harmful material, inappropriate language,
-    and age-appropriateness. It provides detailed safety analysis and recommendations.
-
-    Args:
-        content: The text content to validate
-        age_group: Target age group (e.g., "7-11", "11-14", "14-18")
-        user_id: User identifier for logging and tracking
-
-    Returns:
-        dict: Safety analysis result containing:
-            - isSafe (bool): Whether content passes safety checks
-            - riskLevel (str): "none"|"low"|"medium"|"high"|"critical"
-            - issues (list[dict]): Specific safety issues found
-            - recommendation (str): "approve"|"review"|"block"
-            - reasoning (str): Explanation of the safety decision
-            - alertMessage (str|None): User-facing alert if unsafe
-    """
-    try:
-        print(f"🛡️  [{datetime.utcnow().isoformat()}] Content Safety Check")
-        print(f"   User: {user_id}, Age Group: {age_group}")
-        print(f"   Content length: {len(content)} characters")
-
-        # Configure Gemini
-        api_key = os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY")
-        if not api_key:
-            raise Exception("No API key found for Gemini")
-
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel(
-            "gemini-2.5-flash",
-            system_instruction="""You are a content safety moderator for a children's educational platform.
+_SYSTEM_INSTRUCTION = """You are a content safety moderator for a children's educational platform.
 Analyze content for harmful, inappropriate, or unsafe material."""
-        )
 
-        # Create safety analysis prompt
-        prompt = f"""Analyze this content for safety issues for age group {age_group}:
+_SAFETY_PROMPT_TEMPLATE = """Analyze this content for safety issues for age group {age_group}:
 
 Content: "{content}"
 
@@ -79,54 +49,192 @@ Respond with ONLY valid JSON in this exact format:
   "reasoning": "Detailed explanation of the safety decision"
 }}"""
 
-        # Call Gemini for safety analysis
-        response = model.generate_content(prompt)
-        response_text = response.text.strip()
 
-        # Clean up markdown code blocks if present
-        if response_text.startswith('```json'):
-            response_text = response_text[7:]
-        elif response_text.startswith('```'):
-            response_text = response_text[3:]
-        if response_text.endswith('```'):
-            response_text = response_text[:-3]
-        response_text = response_text.strip()
+_ALERT_MESSAGE_TEMPLATE = (
+    "⚠️ This content has been flagged for review. "
+    "We found %s potential %s that may not be appropriate for this age group."
+)
+
+
+class SafetyIssue(TypedDict):
+    """One safety problem found in the content."""
+
+    category: str
+    severity: str
+    description: str
+
+
+class SafetyResult(TypedDict):
+    """Response schema Gemini must follow for safety analysis."""
+    isSafe: bool
+    riskLevel: str
+    issues: List[SafetyIssue]
+    recommendation: str
+    reasoning: str
+
+
+_GENERATION_CONFIG = genai.GenerationConfig(
+    response_mime_type="application/json",
+    response_schema=SafetyResult
+)
+
+# Local pre-screen: short content that matches none of these terms, and
+# contains no contact details, is approved without calling Gemini.
+# SAFETY_FAST_PATH=0 sends everything to Gemini (e.g. for audits).
+_FAST_PATH_ENABLED = os.getenv("SAFETY_FAST_PATH", "1") != "0"
+_FAST_PATH_MAX_LENGTH = 200
+
+_BANNED_TERMS = (
+    "kill", "killed", "killing", "murder", "blood", "bloody", "gun", "guns", "shoot",
+    "shooting", "knife", "stab", "weapon", "bomb", "die", "died", "dead", "death",
+    "suicide", "hurt myself", "cut myself", "drug", "drugs", "alcohol", "drunk",
+    "beer", "cigarette", "smoke", "sex", "sexy", "naked", "nude", "hate", "stupid",
+    "idiot", "dumb", "ugly", "loser", "shut up", "damn", "hell", "crap", "shit",
+    "fuck", "bitch", "bastard", "ass", "racist"
+)
+
+_SUSPICIOUS = re.compile(
+    r"\b(?:" + "|".join(map(re.escape, _BANNED_TERMS)) + r")\b"
+    r"|@|https?://|www\.|\d{3}",
+    re.IGNORECASE
+)
+
+_FAST_PATH_RESULT = MappingProxyType({
+    "isSafe": True,
+    "riskLevel": "none",
+    "recommendation": "approve",
+    "reasoning": "Short content passed the local safety pre-screen",
+    "alertMessage": None
+})
+
+_SAFETY_MODEL = genai.GenerativeModel(
+    "gemini-2.5-flash",
+    system_instruction=_SYSTEM_INSTRUCTION,
+    generation_config=_GENERATION_CONFIG
+)
+
+# Bound concurrent Gemini calls so classroom-sized bursts stay under quota,
+# share one upstream call between identical in-flight checks, and reuse
+# recent verdicts for resubmitted text
+_SAFETY_SEMAPHORE = asyncio.Semaphore(int(os.getenv("SAFETY_CONCURRENCY", 8)))
+_IN_FLIGHT = InFlight()
+_RESULT_CACHE = TTLCache(maxsize=256, ttl=float(os.getenv("SAFETY_CACHE_TTL", 300)))
+
+
+def _get_model() -> genai.GenerativeModel:
+    """Return the shared safety model."""
+    require_api_key()
+    return _SAFETY_MODEL
+
 
-        # Parse JSON response
-        result = json.loads(response_text)
+async def _analyze(key: str, content: str, age_group: str) -> dict:
+    """Run the Gemini safety analysis and cache the verdict."""
+    model = _get_model()
+    prompt = _SAFETY_PROMPT_TEMPLATE.format(age_group=age_group, content=content)
 
-        # Build safety result
+    # Call Gemini for safety analysis
+    async with _SAFETY_SEMAPHORE:
+        response = await model.generate_content_async(prompt)
+
+    result = parse_json_response(response.text)
+
+    verdict = {
+        "isSafe": result.get("isSafe", True),
+        "riskLevel": result.get("riskLevel", "none"),
+        "issues": result.get("issues", []),
+        "recommendation": result.get("recommendation", "approve"),
+        "reasoning": result.get("reasoning", "Content appears safe"),
+        "alertMessage": None
+    }
+
+    # Generate alert message if unsafe
+    if not verdict["isSafe"]:
+        issue_count = len(verdict["issues"])
+        verdict["alertMessage"] = _ALERT_MESSAGE_TEMPLATE % (
+            issue_count, "issue" if issue_count == 1 else "issues"
+        )
+
+    _RESULT_CACHE.set(key, verdict)
+
+    return verdict
+
+
+async def _get_verdict(content: str, age_group: str) -> dict:
+    """Return a cached, in-flight, or fresh verdict for this content."""
+    key = cache_key(content, age_group)
+
+    cached = _RESULT_CACHE.get(key)
+    if cached is not None:
+        logger.debug("♻️  Reusing cached safety verdict")
+        return cached
+
+    if key in _IN_FLIGHT:
+        logger.debug("♻️  Joining in-flight safety check")
+    return await _IN_FLIGHT.run(key, lambda: _analyze(key, content, age_group))
+
+
+async def check_content_safety(
+    content: str,
+    age_group: str,
+    user_id: str
+) -> dict:
+    """
+    Check if content is safe and age-appropriate using Gemini.
+
+    This tool analyzes text content for harmful material, inappropriate language,
+    and age-appropriateness. It provides detailed safety analysis and recommendations.
+
+    Args:
+        content: The text content to validate
+        age_group: Target age group (e.g., "7-11", "11-14", "14-18")
+        user_id: User identifier for logging and tracking
+
+    Returns:
+        dict: Safety analysis result containing:
+            - isSafe (bool): Whether content passes safety checks
+            - riskLevel (str): "none"|"low"|"medium"|"high"|"critical"
+            - issues (list[dict]): Specific safety issues found
+            - recommendation (str): "approve"|"review"|"block"
+            - reasoning (str): Explanation of the safety decision
+            - alertMessage (str|None): User-facing alert if unsafe
+    """
+    try:
+        logger.debug("🛡️  Content Safety Check")
+        logger.debug("User: %s, Age Group: %s", user_id, age_group)
+        logger.debug("Content length: %s characters", len(content))
+
+        # Short text with nothing suspicious skips the Gemini round-trip
+        if _FAST_PATH_ENABLED and len(content) < _FAST_PATH_MAX_LENGTH and not _SUSPICIOUS.search(content):
+            logger.info("✅ SAFE: passed local pre-screen")
+            return {
+                **_FAST_PATH_RESULT,
+                "issues": [],
+                "userId": user_id,
+                "ageGroup": age_group,
+                "timestamp": datetime.utcnow().isoformat()
+            }
+
+        verdict = await _get_verdict(content, age_group)
+
+        # Build safety result; the verdict may be shared, so copy it
         safety_result = {
-            "isSafe": result.get("isSafe", True),
-            "riskLevel": result.get("riskLevel", "none"),
-            "issues": result.get("issues", []),
-            "recommendation": result.get("recommendation", "approve"),
-            "reasoning": result.get("reasoning", "Content appears safe"),
-            "alertMessage": None,
+            **verdict,
+            "issues": list(verdict["issues"]),
             "userId": user_id,
             "ageGroup": age_group,
             "timestamp": datetime.utcnow().isoformat()
         }
 
-        # Generate alert message if unsafe
-        if not safety_result["isSafe"]:
-            issue_count = len(safety_result["issues"])
-            safety_result["alertMessage"] = (
-                f"⚠️ This content has been flagged for review. "
-                f"We found {issue_count} potential {'issue' if issue_count == 1 else 'issues'} "
-                f"that may not be appropriate for this age group."
-            )
-
         # Log result
         status = "✅ SAFE" if safety_result["isSafe"] else "⚠️  UNSAFE"
-        print(f"   {status}: {safety_result['riskLevel']} risk - {safety_result['recommendation']}")
+        logger.info("%s: %s risk - %s", status, safety_result['riskLevel'], safety_result['recommendation'])
         if safety_result["issues"]:
-            print(f"   Issues: {len(safety_result['issues'])}")
+            logger.debug("Issues: %s", len(safety_result['issues']))
 
         return safety_result
 
     except json.JSONDecodeError as e:
-        print(f"❌ JSON parse error: {str(e)}")
+        logger.error("❌ JSON parse error: %s", e)
         return {
             "isSafe": False,
             "riskLevel": "unknown",
@@ -139,7 +247,7 @@ Respond with ONLY valid JSON in this exact format:
         }
 
     except Exception as e:
-        print(f"❌ Content safety error: {str(e)}")
+        logger.error("❌ Content safety error: %s", e)
         return {
             "isSafe": False,
             "riskLevel": "unknown",
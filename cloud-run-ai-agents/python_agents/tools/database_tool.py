@@ -3,23 +3,64 @@ Database Tool - Updates database records for submissions and media
 """
 
 import os
+import logging
+import asyncio
 import asyncpg
 import json
+import uuid
 from datetime import datetime
+from typing import Optional
 
+logger = logging.getLogger(__name__)
 
-async def _get_db_connection():
-    """Get database connection using asyncpg."""
-    return await asyncpg.connect(
-        host=os.getenv("DB_HOST", "/cloudsql/YOUR_PROJECT_ID:us-central1:fun-writing"),
-        port=int(os.getenv("DB_PORT", 5432)),
-        user=os.getenv("DB_USER", "funwriting"),
-        password=os.getenv("DB_PASSWORD"),
-        database=os.getenv("DB_NAME", "fun_writing_prod")
+# Kept as constants so asyncpg's per-connection statement cache reuses the plans
+_UPDATE_FEEDBACK_SQL = """
+    UPDATE "WritingSubmissions"
+    SET feedback = $1, score = $2, status = 'reviewed', updated_at = NOW()
+    WHERE id = $3
+"""
+
+_INSERT_MEDIA_SQL = """
+    INSERT INTO "GeneratedMedia"
+    (id, submission_id, user_id, media_type, "imageUrl", "videoUrl",
+     file_name, prompt, generation_status, created_at)
+    VALUES ($1, $2, $3, $4, $5, $6, $7, $8, 'completed', NOW())
+    RETURNING id
+"""
+
+_POOL: Optional[asyncpg.Pool] = None
+_POOL_LOCK = asyncio.Lock()
+
+
+async def _init_connection(conn: asyncpg.Connection):
+    """Encode/decode jsonb as Python objects so dicts bind directly."""
+    await conn.set_type_codec(
+        "jsonb", encoder=json.dumps, decoder=json.loads, schema="pg_catalog"
     )
 
 
-def save_submission_feedback(
+async def _pool() -> asyncpg.Pool:
+    """Get the shared connection pool, creating it on first use."""
+    global _POOL
+    if _POOL is None:
+        async with _POOL_LOCK:
+            if _POOL is None:
+                _POOL = await asyncpg.create_pool(
+                    host=os.getenv("DB_HOST", "/cloudsql/YOUR_PROJECT_ID:us-central1:fun-writing"),
+                    port=int(os.getenv("DB_PORT", 5432)),
+                    user=os.getenv("DB_USER", "funwriting"),
+                    password=os.getenv("DB_PASSWORD"),
+                    database=os.getenv("DB_NAME", "fun_writing_prod"),
+                    min_size=int(os.getenv("DB_POOL_MIN", 2)),
+                    max_size=int(os.getenv("DB_POOL_SIZE", 20)),
+                    statement_cache_size=int(os.getenv("DB_STATEMENT_CACHE_SIZE", 1024)),
+                    command_timeout=30,
+                    init=_init_connection
+                )
+    return _POOL
+
+
+async def save_submission_feedback(
     submission_id: str,
     feedback: dict,
     score: int
@@ -43,31 +84,32 @@ def save_submission_feedback(
             - error (str|None): Error message if update failed
     """
     try:
-        print(f"\n💾 [{datetime.utcnow().isoformat()}] Saving Feedback to Database")
-        print(f"   Submission: {submission_id}, Score: {score}")
-
-        # For now, return success without actual DB operation
-        # This will be implemented when database is properly configured
-        # The actual implementation would use asyncpg or sqlalchemy
-
-        # In production, this would be:
-        # async with _get_db_connection() as conn:
-        #     await conn.execute(
-        #         "UPDATE writing_submissions SET feedback = $1, score = $2, status = 'reviewed', updated_at = NOW() WHERE id = $3",
-        #         json.dumps(feedback), score, submission_id
-        #     )
-
-        print(f"   ✅ Feedback saved (mock)")
+        logger.debug("💾 Saving Feedback to Database")
+        logger.debug("Submission: %s, Score: %s", submission_id, score)
+
+        pool = await _pool()
+        async with pool.acquire() as conn:
+            status = await conn.execute(
+                _UPDATE_FEEDBACK_SQL,
+                feedback, score, submission_id
+            )
+        # asyncpg returns the command tag, e.g. "UPDATE 1"
+        updated = status.split()[-1] != "0"
+
+        if updated:
+            logger.info("✅ Feedback saved: %s", submission_id)
+        else:
+            logger.warning("⚠️ Submission not found: %s", submission_id)
 
         return {
             "success": True,
-            "updated": True,
+            "updated": updated,
             "submissionId": submission_id,
             "timestamp": datetime.utcnow().isoformat()
         }
 
     except Exception as e:
-        print(f"❌ Database save error: {str(e)}")
+        logger.error("❌ Database save error: %s", e)
         return {
             "success": False,
             "updated": False,
@@ -76,7 +118,7 @@ def save_submission_feedback(
         }
 
 
-def create_media_record(
+async def create_media_record(
     submission_id: str,
     media_type: str,
     url: str,
@@ -105,27 +147,26 @@ def create_media_record(
             - error (str|None): Error message if creation failed
     """
     try:
-        print(f"\n💾 [{datetime.utcnow().isoformat()}] Creating Media Record")
-        print(f"   Submission: {submission_id}, Type: {media_type}")
-        print(f"   URL: {url}")
-
-        # For now, return success without actual DB operation
-        # In production, this would create a record in the generated_media table
-
-        # async with _get_db_connection() as conn:
-        #     media_id = await conn.fetchval(
-        #         """INSERT INTO generated_media
-        #            (submission_id, media_type, url, filename, generation_prompt, user_id)
-        #            VALUES ($1, $2, $3, $4, $5, $6)
-        #            RETURNING id""",
-        #         submission_id, media_type, url, filename, prompt, user_id
-        #     )
-
-        # Mock media_id for now
-        import uuid
-        media_id = str(uuid.uuid4())
-
-        print(f"   ✅ Media record created: {media_id} (mock)")
+        logger.debug("💾 Creating Media Record")
+        logger.debug("Submission: %s, Type: %s", submission_id, media_type)
+        logger.debug("URL: %s", url)
+
+        pool = await _pool()
+        async with pool.acquire() as conn:
+            media_id = await conn.fetchval(
+                _INSERT_MEDIA_SQL,
+                uuid.uuid4(),
+                submission_id,
+                user_id,
+                media_type,
+                url if media_type == "image" else None,
+                url if media_type != "image" else None,
+                filename,
+                prompt
+            )
+        media_id = str(media_id)
+
+        logger.info("✅ Media record created: %s", media_id)
 
         return {
             "success": True,
@@ -135,7 +176,7 @@ def create_media_record(
         }
 
     except Exception as e:
-        print(f"❌ Media record creation error: {str(e)}")
+        logger.error("❌ Media record creation error: %s", e)
         return {
             "success": False,
             "error": str(e),
@@ -3,86 +3,33 @@ Feedback Analysis Tool - Analyzes student writing and provides detailed feedback
 """
 
 import google.generativeai as genai
+from google.generativeai import caching
+from google import genai as genai_client
+from google.genai import types
 import os
+import logging
+import io
 import json
-from datetime import datetime
+import asyncio
+import hashlib
+from datetime import datetime, timedelta, timezone
+from typing import Annotated, Dict, List, Optional, Tuple
+from pydantic import AfterValidator, BaseModel, Field, ValidationError
 from .content_safety_tool import check_content_safety
+from ..gemini_config import require_api_key
+from .json_response import parse_json_response
+from .result_cache import TTLCache, cache_key
+from .writing_budget import trim_writing
 
+logger = logging.getLogger(__name__)
 
-def analyze_student_writing(
-    student_writing: str,
-    original_prompt: str,
-    age_group: str,
-    submission_id: str,
-    user_id: str
-) -> dict:
-    """
-    Analyze student writing and provide comprehensive feedback using Gemini.
-
-    This tool performs a complete writing analysis including safety validation,
-    evaluation across multiple dimensions, and generation of detailed,
-    age-appropriate feedback.
-
-    Args:
-        student_writing: The student's submitted text
-        original_prompt: The writing prompt that was given to the student
-        age_group: Student's age group (e.g., "7-11", "11-14", "14-18")
-        submission_id: Unique identifier for this submission
-        user_id: User identifier
-
-    Returns:
-        dict: Analysis result containing:
-            - success (bool): Whether analysis completed successfully
-            - score (int): Total score out of 100
-            - feedback (dict): Detailed feedback across all dimensions
-            - safetyCheck (dict): Content safety validation results
-            - error (str|None): Error message if analysis failed
-    """
-    try:
-        print(f"\n📊 [{datetime.utcnow().isoformat()}] Writing Analysis")
-        print(f"   Submission: {submission_id}")
-        print(f"   User: {user_id}, Age Group: {age_group}")
-        print(f"   Writing length: {len(student_writing)} characters")
-
-        # Step 1: Content safety check
-        print(f"\n🛡️  Step 1: Content Safety Check")
-        safety_result = check_content_safety(student_writing, age_group, user_id)
-
-        # If content is not safe, return early with alert
-        if not safety_result["isSafe"]:
-            print(f"   🚨 Content blocked: {safety_result['riskLevel']} risk")
-            return {
-                "success": False,
-                "blocked": True,
-                "safetyCheck": safety_result,
-                "alertMessage": safety_result.get("alertMessage"),
-                "recommendation": safety_result.get("recommendation")
-            }
-
-        # Step 2: Evaluate writing with Gemini
-        print(f"\n📝 Step 2: Evaluating Writing")
-
-        api_key = os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY")
-        if not api_key:
-            raise Exception("No API key found for Gemini")
+_EVALUATION_MODEL = "models/gemini-2.5-flash"
 
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel(
-            "gemini-2.5-flash",
-            system_instruction="""You are an encouraging educational AI evaluating student writing.
+_EVALUATION_SYSTEM_INSTRUCTION = """You are an encouraging educational AI evaluating student writing.
 Provide comprehensive, detailed feedback that is constructive and age-appropriate."""
-        )
-
-        # Create evaluation prompt
-        evaluation_prompt = f"""Evaluate this student's writing (Age: {age_group}).
 
-**Original Writing Prompt**:
-"{original_prompt}"
-
-**Student Writing**:
-"{student_writing}"
-
-Evaluate across 4 dimensions (each out of 25 points, total 100):
+# Static rubric, sent first so it can be served from Gemini's context cache
+_EVALUATION_RUBRIC = """Evaluate the student writing across 4 dimensions (each out of 25 points, total 100):
 
 **1. GRAMMAR & SENTENCE STRUCTURE (0-25 points)**
 - Correct sentence structure (subject, verb, object)
@@ -110,100 +57,305 @@ Evaluate across 4 dimensions (each out of 25 points, total 100):
 - Use of descriptive and figurative language
 
 Respond with ONLY valid JSON in this EXACT format:
-{{
-  "grammar": {{
+{
+  "grammar": {
     "score": 20,
     "issues": ["specific issue 1", "specific issue 2"],
     "feedback": "detailed feedback on grammar and sentence structure"
-  }},
-  "spelling": {{
+  },
+  "spelling": {
     "score": 22,
     "misspelledWords": ["word1", "word2"],
     "feedback": "detailed feedback on spelling and vocabulary"
-  }},
-  "relevance": {{
+  },
+  "relevance": {
     "score": 18,
     "addressed": ["aspect 1 they covered", "aspect 2 they covered"],
     "missing": ["aspect they missed"],
     "feedback": "detailed feedback on how well they addressed the prompt"
-  }},
-  "creativity": {{
+  },
+  "creativity": {
     "score": 19,
     "creativeElements": ["creative element 1", "creative element 2"],
     "feedback": "detailed feedback on creativity and originality"
-  }},
+  },
   "strengths": ["strength 1", "strength 2", "strength 3"],
   "areasForImprovement": ["area 1", "area 2"],
   "generalComment": "encouraging overall comment on their writing",
   "nextSteps": ["actionable step 1", "actionable step 2", "actionable step 3"]
-}}
+}
 
 Be specific, encouraging, and age-appropriate in all feedback."""
 
+_EVALUATION_REQUEST_TEMPLATE = """Evaluate this student's writing (Age: {age_group}).
+
+**Original Writing Prompt**:
+"{original_prompt}"
+
+**Student Writing**:
+"{student_writing}"
+"""
+
+
+def _check_dimension_score(score: int) -> int:
+    """Reject dimension scores outside the rubric's 0-25 range."""
+    if not 0 <= score <= 25:
+        raise ValueError(f"dimension score {score} is outside 0-25")
+    return score
+
+
+# The range is stated in the schema description and enforced on parse; the
+# pinned Gemini SDK's Schema has no minimum/maximum fields to send it as
+DimensionScore = Annotated[
+    int,
+    Field(description="Score from 0 to 25"),
+    AfterValidator(_check_dimension_score)
+]
+
+
+class GrammarEvaluation(BaseModel):
+    """Grammar and sentence structure assessment."""
+
+    score: DimensionScore
+    issues: List[str]
+    feedback: str
+
+
+class SpellingEvaluation(BaseModel):
+    """Spelling and vocabulary assessment."""
+
+    score: DimensionScore
+    misspelledWords: List[str]
+    feedback: str
+
+
+class RelevanceEvaluation(BaseModel):
+    """How well the writing addresses the prompt."""
+
+    score: DimensionScore
+    addressed: List[str]
+    missing: List[str]
+    feedback: str
+
+
+class CreativityEvaluation(BaseModel):
+    """Creativity and originality assessment."""
+
+    score: DimensionScore
+    creativeElements: List[str]
+    feedback: str
+
+
+class WritingEvaluation(BaseModel):
+    """Response schema Gemini must follow for writing evaluation."""
+
+    grammar: GrammarEvaluation
+    spelling: SpellingEvaluation
+    relevance: RelevanceEvaluation
+    creativity: CreativityEvaluation
+    strengths: List[str]
+    areasForImprovement: List[str]
+    generalComment: str
+    nextSteps: List[str]
+
+
+_GENERATION_CONFIG = genai.GenerationConfig(
+    response_mime_type="application/json",
+    response_schema=WritingEvaluation
+)
+
+# Batch API requests are plain JSON, so they carry the schema as JSON Schema
+_EVALUATION_JSON_SCHEMA = WritingEvaluation.model_json_schema()
+
+_BATCH_TERMINAL_STATES = frozenset({
+    "JOB_STATE_SUCCEEDED",
+    "JOB_STATE_FAILED",
+    "JOB_STATE_CANCELLED",
+    "JOB_STATE_EXPIRED"
+})
+_BATCH_POLL_INITIAL_DELAY = 5
+_BATCH_POLL_MAX_DELAY = 60
+
+_BATCH_CLIENT: Optional[genai_client.Client] = None
+
+# Used whenever the rubric isn't in a context cache
+_UNCACHED_EVALUATION_MODEL = genai.GenerativeModel(
+    _EVALUATION_MODEL,
+    system_instruction=_EVALUATION_SYSTEM_INSTRUCTION,
+    generation_config=_GENERATION_CONFIG
+)
+
+# Identifies the cached rubric; changes whenever the instruction or rubric text does
+_RUBRIC_VERSION = hashlib.sha256(
+    (_EVALUATION_SYSTEM_INSTRUCTION + _EVALUATION_RUBRIC).encode()
+).hexdigest()[:12]
+
+# Completed analyses for resubmitted drafts, keyed on the inputs and rubric
+_RESULT_CACHE = TTLCache(
+    maxsize=int(os.getenv("FEEDBACK_CACHE_SIZE", 10_000)),
+    ttl=float(os.getenv("FEEDBACK_CACHE_TTL", 86400))
+)
+
+_CONTEXT_CACHE_TTL = timedelta(hours=1)
+_CONTEXT_CACHE_REFRESH_MARGIN = timedelta(minutes=5)
+
+_RUBRIC_CACHES: Dict[str, caching.CachedContent] = {}
+# Model bound to each rubric cache, rebuilt only when the cache is recreated
+_RUBRIC_MODELS: Dict[str, genai.GenerativeModel] = {}
+_RUBRIC_CACHE_LOCK = asyncio.Lock()
+# Cleared if the cache can't be created (e.g. prompt below the minimum size)
+_CONTEXT_CACHE_ENABLED = os.getenv("GEMINI_CONTEXT_CACHE", "1") != "0"
+
+
+async def _get_evaluation_model() -> Tuple[genai.GenerativeModel, bool]:
+    """
+    Return the evaluation model and whether the rubric is in its cached context.
+
+    The rubric cache is created on first use and recreated shortly before it
+    expires. Without a cache the caller must send the rubric itself.
+    """
+    global _CONTEXT_CACHE_ENABLED
+
+    require_api_key()
+
+    if _CONTEXT_CACHE_ENABLED:
+        async with _RUBRIC_CACHE_LOCK:
+            cache: Optional[caching.CachedContent] = _RUBRIC_CACHES.get(_RUBRIC_VERSION)
+            now = datetime.now(timezone.utc)
+            if cache is None or cache.expire_time - now < _CONTEXT_CACHE_REFRESH_MARGIN:
+                try:
+                    cache = await asyncio.to_thread(
+                        caching.CachedContent.create,
+                        model=_EVALUATION_MODEL,
+                        display_name=f"writing-rubric-{_RUBRIC_VERSION}",
+                        system_instruction=_EVALUATION_SYSTEM_INSTRUCTION,
+                        contents=[_EVALUATION_RUBRIC],
+                        ttl=_CONTEXT_CACHE_TTL
+                    )
+                    _RUBRIC_CACHES[_RUBRIC_VERSION] = cache
+                    _RUBRIC_MODELS[_RUBRIC_VERSION] = genai.GenerativeModel.from_cached_content(
+                        cached_content=cache,
+                        generation_config=_GENERATION_CONFIG
+                    )
+                    logger.debug("🗄️  Rubric context cache created: %s", cache.name)
+                except Exception as e:
+                    logger.warning("⚠️  Rubric context cache unavailable, sending full prompt: %s", e)
+                    _CONTEXT_CACHE_ENABLED = False
+                    cache = None
+
+        if cache is not None:
+            return _RUBRIC_MODELS[_RUBRIC_VERSION], True
+
+    return _UNCACHED_EVALUATION_MODEL, False
+
+
+async def analyze_student_writing(
+    student_writing: str,
+    original_prompt: str,
+    age_group: str,
+    submission_id: str,
+    user_id: str
+) -> dict:
+    """
+    Analyze student writing and provide comprehensive feedback using Gemini.
+
+    This tool performs a complete writing analysis including safety validation,
+    evaluation across multiple dimensions, and generation of detailed,
+    age-appropriate feedback.
+
+    Args:
+        student_writing: The student's submitted text
+        original_prompt: The writing prompt that was given to the student
+        age_group: Student's age group (e.g., "7-11", "11-14", "14-18")
+        submission_id: Unique identifier for this submission
+        user_id: User identifier
+
+    Returns:
+        dict: Analysis result containing:
+            - success (bool): Whether analysis completed successfully
+            - score (int): Total score out of 100
+            - feedback (dict): Detailed feedback across all dimensions
+            - safetyCheck (dict): Content safety validation results
+            - error (str|None): Error message if analysis failed
+    """
+    try:
+        logger.debug("📊 Writing Analysis")
+        logger.debug("Submission: %s", submission_id)
+        logger.debug("User: %s, Age Group: %s", user_id, age_group)
+        logger.debug("Writing length: %s characters", len(student_writing))
+
+        evaluated_writing, truncated = trim_writing(student_writing)
+        result_key = cache_key(evaluated_writing, truncated, original_prompt, age_group, _RUBRIC_VERSION)
+        cached = _RESULT_CACHE.get(result_key)
+        if cached is not None:
+            logger.debug("♻️  Reusing cached analysis: %s/100", cached['score'])
+            return {
+                **cached,
+                "feedback": {
+                    **cached["feedback"],
+                    "submissionId": submission_id,
+                    "timestamp": datetime.utcnow().isoformat()
+                }
+            }
+
+        # Step 1: Content safety check
+        logger.debug("🛡️  Step 1: Content Safety Check")
+        safety_result = await check_content_safety(student_writing, age_group, user_id)
+
+        # If content is not safe, return early with alert
+        if not safety_result["isSafe"]:
+            logger.warning("🚨 Content blocked: %s risk", safety_result['riskLevel'])
+            return {
+                "success": False,
+                "blocked": True,
+                "safetyCheck": safety_result,
+                "alertMessage": safety_result.get("alertMessage"),
+                "recommendation": safety_result.get("recommendation")
+            }
+
+        # Step 2: Evaluate writing with Gemini
+        logger.debug("📝 Step 2: Evaluating Writing")
+
+        model, rubric_cached = await _get_evaluation_model()
+
+        # Only the per-submission part is sent when the rubric is cached
+        evaluation_request = _EVALUATION_REQUEST_TEMPLATE.format(
+            age_group=age_group,
+            original_prompt=original_prompt,
+            student_writing=evaluated_writing
+        )
+        contents = evaluation_request if rubric_cached else [_EVALUATION_RUBRIC, evaluation_request]
+
         # Call Gemini for evaluation
-        response = model.generate_content(evaluation_prompt)
-        response_text = response.text.strip()
-
-        # Clean up markdown code blocks
-        if response_text.startswith('```json'):
-            response_text = response_text[7:]
-        elif response_text.startswith('```'):
-            response_text = response_text[3:]
-        if response_text.endswith('```'):
-            response_text = response_text[:-3]
-        response_text = response_text.strip()
-
-        # Parse JSON response
-        result = json.loads(response_text)
-
-        # Extract and validate scores
-        grammar = result.get("grammar", {})
-        spelling = result.get("spelling", {})
-        relevance = result.get("relevance", {})
-        creativity = result.get("creativity", {})
-
-        # Calculate total score
-        grammar_score = max(0, min(25, grammar.get("score", 15)))
-        spelling_score = max(0, min(25, spelling.get("score", 18)))
-        relevance_score = max(0, min(25, relevance.get("score", 16)))
-        creativity_score = max(0, min(25, creativity.get("score", 17)))
-
-        total_score = grammar_score + spelling_score + relevance_score + creativity_score
-
-        # Build comprehensive feedback
-        feedback = {
-            "totalScore": total_score,
-            "breakdown": {
-                "grammar": grammar_score,
-                "spelling": spelling_score,
-                "relevance": relevance_score,
-                "creativity": creativity_score
-            },
-            "grammarFeedback": grammar.get("feedback", "Good grammar overall"),
-            "spellingFeedback": spelling.get("feedback", "Good spelling overall"),
-            "relevanceFeedback": relevance.get("feedback", "Good relevance overall"),
-            "creativityFeedback": creativity.get("feedback", "Good creativity overall"),
-            "strengths": result.get("strengths", []),
-            "areasForImprovement": result.get("areasForImprovement", []),
-            "generalComment": result.get("generalComment", _generate_general_comment(total_score)),
-            "nextSteps": result.get("nextSteps", []),
-            "submissionId": submission_id,
-            "timestamp": datetime.utcnow().isoformat()
-        }
+        response = await model.generate_content_async(contents)
 
-        print(f"\n✅ Analysis Complete")
-        print(f"   Total Score: {total_score}/100")
-        print(f"   Breakdown: G:{grammar_score} S:{spelling_score} R:{relevance_score} C:{creativity_score}")
+        # Parsing validates every field and score against the schema
+        evaluation = parse_json_response(response.text, WritingEvaluation)
 
-        return {
+        feedback = _build_feedback(evaluation, submission_id, truncated)
+        total_score = feedback["totalScore"]
+        breakdown = feedback["breakdown"]
+
+        logger.info("✅ Analysis Complete")
+        logger.debug("Total Score: %s/100", total_score)
+        logger.debug(
+            "Breakdown: G:%s S:%s R:%s C:%s",
+            breakdown['grammar'], breakdown['spelling'],
+            breakdown['relevance'], breakdown['creativity']
+        )
+
+        analysis = {
             "success": True,
             "score": total_score,
             "feedback": feedback,
             "safetyCheck": safety_result
         }
+        _RESULT_CACHE.set(result_key, analysis)
 
-    except json.JSONDecodeError as e:
-        print(f"❌ JSON parse error: {str(e)}")
+        return analysis
+
+    except ValidationError as e:
+        logger.error("❌ Evaluation schema error: %s", e)
         return {
             "success": False,
             "error": f"Failed to parse evaluation results: {str(e)}",
@@ -211,7 +363,7 @@ Be specific, encouraging, and age-appropriate in all feedback."""
         }
 
     except Exception as e:
-        print(f"❌ Writing analysis error: {str(e)}")
+        logger.error("❌ Writing analysis error: %s", e)
         return {
             "success": False,
             "error": str(e),
@@ -219,6 +371,184 @@ Be specific, encouraging, and age-appropriate in all feedback."""
         }
 
 
+async def analyze_student_writing_batch(submissions: List[dict]) -> dict:
+    """
+    Analyze many student writings through the Gemini Batch API.
+
+    Meant for background jobs such as bulk re-scoring: batch jobs cost about
+    half as much per token but take minutes or longer to complete. Each
+    writing is still safety checked first; blocked writings are not sent.
+    Use analyze_student_writing for interactive requests.
+
+    Args:
+        submissions: One dict per submission with the same keys as
+            analyze_student_writing's arguments (student_writing,
+            original_prompt, age_group, submission_id, user_id)
+
+    Returns:
+        dict: Batch result containing:
+            - success (bool): Whether the batch job completed
+            - batchName (str): Gemini batch job name
+            - results (list[dict]): One result per submission, in order, with
+              the same fields as analyze_student_writing plus submissionId
+            - error (str|None): Error message if the batch failed
+    """
+    try:
+        logger.debug("📊 Batch Writing Analysis")
+        logger.debug("Submissions: %s", len(submissions))
+
+        safety_results = await asyncio.gather(*(
+            check_content_safety(item["student_writing"], item["age_group"], item["user_id"])
+            for item in submissions
+        ))
+
+        results = {}
+        truncated_ids = set()
+        lines = []
+        for item, safety_result in zip(submissions, safety_results):
+            submission_id = item["submission_id"]
+            if not safety_result["isSafe"]:
+                results[submission_id] = {
+                    "success": False,
+                    "blocked": True,
+                    "safetyCheck": safety_result,
+                    "alertMessage": safety_result.get("alertMessage"),
+                    "recommendation": safety_result.get("recommendation")
+                }
+                continue
+
+            results[submission_id] = {"success": False, "safetyCheck": safety_result}
+            evaluated_writing, truncated = trim_writing(item["student_writing"])
+            if truncated:
+                truncated_ids.add(submission_id)
+            evaluation_request = _EVALUATION_REQUEST_TEMPLATE.format(
+                age_group=item["age_group"],
+                original_prompt=item["original_prompt"],
+                student_writing=evaluated_writing
+            )
+            lines.append(json.dumps({
+                "key": submission_id,
+                "request": {
+                    "system_instruction": {"parts": [{"text": _EVALUATION_SYSTEM_INSTRUCTION}]},
+                    "contents": [{
+                        "role": "user",
+                        "parts": [{"text": _EVALUATION_RUBRIC}, {"text": evaluation_request}]
+                    }],
+                    "generation_config": {
+                        "response_mime_type": "application/json",
+                        "response_json_schema": _EVALUATION_JSON_SCHEMA
+                    }
+                }
+            }))
+
+        batch_name = None
+        if lines:
+            client = _get_batch_client()
+
+            requests_file = await client.aio.files.upload(
+                file=io.BytesIO("\n".join(lines).encode()),
+                config=types.UploadFileConfig(
+                    display_name=f"writing-batch-{datetime.utcnow():%Y%m%d%H%M%S}",
+                    mime_type="jsonl"
+                )
+            )
+            job = await client.aio.batches.create(
+                model=_EVALUATION_MODEL,
+                src=requests_file.name
+            )
+            batch_name = job.name
+            logger.debug("📨 Batch job submitted: %s (%s requests)", batch_name, len(lines))
+
+            # Batch jobs run for minutes to hours; back off between polls
+            delay = _BATCH_POLL_INITIAL_DELAY
+            while job.state.name not in _BATCH_TERMINAL_STATES:
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, _BATCH_POLL_MAX_DELAY)
+                job = await client.aio.batches.get(name=batch_name)
+
+            if job.state.name != "JOB_STATE_SUCCEEDED":
+                raise Exception(f"Batch job {batch_name} ended in {job.state.name}")
+
+            output = await client.aio.files.download(file=job.dest.file_name)
+            for line in output.decode().splitlines():
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                result = results[entry["key"]]
+                try:
+                    if "error" in entry:
+                        raise Exception(entry["error"].get("message", "Batch request failed"))
+                    text = entry["response"]["candidates"][0]["content"]["parts"][0]["text"]
+                    evaluation = parse_json_response(text, WritingEvaluation)
+                    feedback = _build_feedback(evaluation, entry["key"], entry["key"] in truncated_ids)
+                    result.update(success=True, score=feedback["totalScore"], feedback=feedback)
+                except Exception as e:
+                    result["error"] = str(e)
+
+        ordered = [
+            {**results[item["submission_id"]], "submissionId": item["submission_id"]}
+            for item in submissions
+        ]
+        succeeded = sum(1 for result in ordered if result["success"])
+        logger.info("✅ Batch complete: %s/%s analyzed", succeeded, len(ordered))
+
+        return {
+            "success": True,
+            "batchName": batch_name,
+            "results": ordered
+        }
+
+    except Exception as e:
+        logger.error("❌ Batch writing analysis error: %s", e)
+        return {
+            "success": False,
+            "error": str(e),
+            "timestamp": datetime.utcnow().isoformat()
+        }
+
+
+def _build_feedback(
+    evaluation: WritingEvaluation,
+    submission_id: str,
+    truncated: bool = False
+) -> dict:
+    """Build the feedback record stored for a submission from an evaluation."""
+    breakdown = {
+        "grammar": evaluation.grammar.score,
+        "spelling": evaluation.spelling.score,
+        "relevance": evaluation.relevance.score,
+        "creativity": evaluation.creativity.score
+    }
+    total_score = sum(breakdown.values())
+
+    return {
+        "totalScore": total_score,
+        "breakdown": breakdown,
+        "grammarFeedback": evaluation.grammar.feedback,
+        "spellingFeedback": evaluation.spelling.feedback,
+        "relevanceFeedback": evaluation.relevance.feedback,
+        "creativityFeedback": evaluation.creativity.feedback,
+        "strengths": evaluation.strengths,
+        "areasForImprovement": evaluation.areasForImprovement,
+        "generalComment": evaluation.generalComment or _generate_general_comment(total_score),
+        "nextSteps": evaluation.nextSteps,
+        # Only the opening WRITING_MAX_WORDS words were evaluated
+        "truncated": truncated,
+        "submissionId": submission_id,
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+
+def _get_batch_client() -> genai_client.Client:
+    """Return the google-genai client used for batch jobs."""
+    global _BATCH_CLIENT
+
+    if _BATCH_CLIENT is None:
+        _BATCH_CLIENT = genai_client.Client(api_key=require_api_key())
+
+    return _BATCH_CLIENT
+
+
 def _generate_general_comment(score: int) -> str:
     """Generate fallback general comment based on score."""
     if score >= 90:
@@ -3,12 +3,95 @@ GCS Storage Tool - Uploads media files to Google Cloud Storage
 """
 
 import os
-import uuid
+import io
+import asyncio
+import itertools
+import logging
+import secrets
+import threading
+import time
 from datetime import datetime
+from typing import AsyncIterable, Optional
 from google.cloud import storage
+from google.cloud.storage.retry import DEFAULT_RETRY
 
+logger = logging.getLogger(__name__)
 
-def upload_image_to_gcs(
+_BUCKET_NAME = os.getenv("GCS_BUCKET_NAME", "fun-writing-media-prod")
+
+# Objects above this size (videos, large comic panels) use a chunked
+# resumable upload, so a dropped connection resends one chunk rather than
+# the whole file. Chunks must be a multiple of 256 KiB.
+_RESUMABLE_THRESHOLD = 8 * 1024 * 1024
+_CHUNK_ALIGNMENT = 256 * 1024
+_CHUNK_SIZE = max(
+    _CHUNK_ALIGNMENT,
+    int(os.getenv("GCS_CHUNK_SIZE", 8 * 1024 * 1024)) // _CHUNK_ALIGNMENT * _CHUNK_ALIGNMENT
+)
+
+# Shared client and bucket handle; a client per upload repeats credential
+# discovery and connection setup on every call
+_BUCKET: Optional[storage.Bucket] = None
+_LOCK = threading.Lock()
+
+# Upload filenames: a per-process tag (so instances and forked workers never
+# overlap) plus a counter seeded from the clock, instead of a UUID per upload
+_PROCESS_TAG = secrets.token_hex(2)
+_COUNTER = itertools.count(int(time.time() * 1000))
+
+
+def _unique_id() -> str:
+    """Return an identifier unique to this upload."""
+    return f"{_PROCESS_TAG}{next(_COUNTER):x}"
+
+
+def _get_bucket() -> storage.Bucket:
+    """Return the shared bucket handle, creating the client on first use."""
+    global _BUCKET
+
+    if _BUCKET is None:
+        with _LOCK:
+            if _BUCKET is None:
+                _BUCKET = storage.Client().bucket(_BUCKET_NAME)
+
+    return _BUCKET
+
+
+def _reset_after_fork():
+    """Drop the inherited client and filename tag; both belong to the parent."""
+    global _BUCKET, _LOCK, _PROCESS_TAG
+    _BUCKET = None
+    _LOCK = threading.Lock()
+    _PROCESS_TAG = secrets.token_hex(2)
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _upload_bytes(filename: str, data: bytes, content_type: str):
+    """Upload bytes to a GCS blob (blocking; run in a worker thread)."""
+    if len(data) <= _RESUMABLE_THRESHOLD:
+        # Small objects go up in a single request
+        blob = _get_bucket().blob(filename)
+        blob.upload_from_string(data, content_type=content_type)
+        return
+
+    blob = _get_bucket().blob(filename, chunk_size=_CHUNK_SIZE)
+    blob.upload_from_file(
+        io.BytesIO(data),
+        size=len(data),
+        content_type=content_type,
+        retry=DEFAULT_RETRY
+    )
+
+
+def _open_writer(filename: str, content_type: str):
+    """Open a chunked resumable writer for a GCS blob (blocking on first use)."""
+    blob = _get_bucket().blob(filename, chunk_size=_CHUNK_SIZE)
+    return blob.open("wb", content_type=content_type, retry=DEFAULT_RETRY)
+
+
+async def upload_image_to_gcs(
     image_data: bytes,
     submission_id: str,
     image_index: int,
@@ -36,47 +119,42 @@ def upload_image_to_gcs(
             - error (str|None): Error message if upload failed
     """
     try:
-        print(f"\n📤 [{datetime.utcnow().isoformat()}] Image Upload to GCS")
-        print(f"   Submission: {submission_id}, Index: {image_index}")
-        print(f"   Size: {len(image_data)} bytes, Format: {file_format}")
-
-        # Get bucket configuration
-        bucket_name = os.getenv("GCS_BUCKET_NAME", "fun-writing-media-prod")
-
-        # Initialize GCS client
-        storage_client = storage.Client()
-        bucket = storage_client.bucket(bucket_name)
+        logger.debug(
+            "📤 Image upload to GCS: submission=%s index=%s size=%s format=%s",
+            submission_id, image_index, len(image_data), file_format
+        )
 
         # Generate unique filename
-        unique_id = str(uuid.uuid4())[:8]
+        unique_id = _unique_id()
         filename = f"images/{submission_id}_{unique_id}_{image_index}.{file_format}"
 
-        # Upload to GCS
-        blob = bucket.blob(filename)
-        blob.upload_from_string(
+        # Upload to GCS off the event loop; the storage client is sync
+        await asyncio.to_thread(
+            _upload_bytes,
+            filename,
             image_data,
-            content_type=f"image/{file_format}"
+            f"image/{file_format}"
         )
 
         # Make blob public (assuming bucket has public access configured)
         # blob.make_public()  # Commented out if bucket-level IAM is configured
 
         # Generate public URL
-        public_url = f"https://storage.googleapis.com/{bucket_name}/{filename}"
+        public_url = f"https://storage.googleapis.com/{_BUCKET_NAME}/{filename}"
 
-        print(f"   ✅ Uploaded: {public_url}")
+        logger.debug("✅ Uploaded: %s", public_url)
 
         return {
             "success": True,
             "url": public_url,
             "filename": filename,
-            "bucket": bucket_name,
+            "bucket": _BUCKET_NAME,
             "size": len(image_data),
             "timestamp": datetime.utcnow().isoformat()
         }
 
     except Exception as e:
-        print(f"❌ GCS upload error: {str(e)}")
+        logger.exception("GCS upload error")
         return {
             "success": False,
             "error": str(e),
@@ -84,7 +162,7 @@ def upload_image_to_gcs(
         }
 
 
-def upload_video_to_gcs(
+async def upload_video_to_gcs(
     video_data: bytes,
     submission_id: str,
     file_format: str = "mp4"
@@ -110,44 +188,100 @@ def upload_video_to_gcs(
             - error (str|None): Error message if upload failed
     """
     try:
-        print(f"\n📤 [{datetime.utcnow().isoformat()}] Video Upload to GCS")
-        print(f"   Submission: {submission_id}")
-        print(f"   Size: {len(video_data)} bytes, Format: {file_format}")
-
-        # Get bucket configuration
-        bucket_name = os.getenv("GCS_BUCKET_NAME", "fun-writing-media-prod")
-
-        # Initialize GCS client
-        storage_client = storage.Client()
-        bucket = storage_client.bucket(bucket_name)
+        logger.debug(
+            "📤 Video upload to GCS: submission=%s size=%s format=%s",
+            submission_id, len(video_data), file_format
+        )
 
         # Generate unique filename
-        unique_id = str(uuid.uuid4())[:8]
+        unique_id = _unique_id()
         filename = f"videos/{submission_id}_{unique_id}.{file_format}"
 
-        # Upload to GCS
-        blob = bucket.blob(filename)
-        blob.upload_from_string(
+        # Upload to GCS off the event loop; the storage client is sync
+        await asyncio.to_thread(
+            _upload_bytes,
+            filename,
             video_data,
-            content_type=f"video/{file_format}"
+            f"video/{file_format}"
         )
 
         # Generate public URL
-        public_url = f"https://storage.googleapis.com/{bucket_name}/{filename}"
+        public_url = f"https://storage.googleapis.com/{_BUCKET_NAME}/{filename}"
 
-        print(f"   ✅ Uploaded: {public_url}")
+        logger.debug("✅ Uploaded: %s", public_url)
 
         return {
             "success": True,
             "url": public_url,
             "filename": filename,
-            "bucket": bucket_name,
+            "bucket": _BUCKET_NAME,
             "size": len(video_data),
             "timestamp": datetime.utcnow().isoformat()
         }
 
     except Exception as e:
-        print(f"❌ GCS upload error: {str(e)}")
+        logger.exception("GCS upload error")
+        return {
+            "success": False,
+            "error": str(e),
+            "timestamp": datetime.utcnow().isoformat()
+        }
+
+
+async def upload_video_stream_to_gcs(
+    chunks: AsyncIterable[bytes],
+    submission_id: str,
+    file_format: str = "mp4"
+) -> dict:
+    """
+    Stream a video into Google Cloud Storage as it arrives.
+
+    Chunks are written through a resumable upload, so at most one upload
+    chunk is held in memory instead of the whole file. The object only
+    appears once every chunk has been written.
+
+    Args:
+        chunks: Video bytes, in order
+        submission_id: Submission identifier for organizing files
+        file_format: File extension (e.g., "mp4", "webm")
+
+    Returns:
+        dict: Upload result with the same fields as upload_video_to_gcs
+    """
+    try:
+        logger.debug("📤 Video stream to GCS: submission=%s format=%s", submission_id, file_format)
+
+        # Generate unique filename
+        unique_id = _unique_id()
+        filename = f"videos/{submission_id}_{unique_id}.{file_format}"
+
+        writer = await asyncio.to_thread(_open_writer, filename, f"video/{file_format}")
+
+        # Writes block once a full chunk is buffered, so they run off the
+        # event loop. The writer is only closed (finalizing the object) on
+        # success; an abandoned resumable session simply expires.
+        size = 0
+        async for chunk in chunks:
+            await asyncio.to_thread(writer.write, chunk)
+            size += len(chunk)
+        await asyncio.to_thread(writer.close)
+
+        # Generate public URL
+        public_url = f"https://storage.googleapis.com/{_BUCKET_NAME}/{filename}"
+
+        logger.debug("✅ Uploaded: %s", public_url)
+
+        return {
+            "success": True,
+            "url": public_url,
+            "filename": filename,
+            "bucket": _BUCKET_NAME,
+            "size": size,
+            "timestamp": datetime.utcnow().isoformat()
+        }
+
+    except Exception as e:
+        logger.exception("GCS upload error")
         return {
             "success": False,
             "error": str(e),
@@ -0,0 +1,43 @@
+"""
+HTTP Session - Process-wide pooled aiohttp session for media downloads
+"""
+
+from typing import Optional
+
+import aiohttp
+
+# Image downloads finish well within this; longer transfers pass their own
+_DEFAULT_TIMEOUT = aiohttp.ClientTimeout(total=30)
+
+# Pooled keep-alive connections: concurrent downloads from
+# storage.googleapis.com reuse warm TLS connections instead of handshaking
+_MAX_CONNECTIONS = 64
+_MAX_CONNECTIONS_PER_HOST = 32
+_KEEPALIVE_TIMEOUT = 60
+
+# One keep-alive session per process, opened on first download
+_HTTP_SESSION: Optional[aiohttp.ClientSession] = None
+
+
+def get_http_session() -> aiohttp.ClientSession:
+    """Return the shared HTTP session, creating it on first use."""
+    global _HTTP_SESSION
+    if _HTTP_SESSION is None or _HTTP_SESSION.closed:
+        _HTTP_SESSION = aiohttp.ClientSession(
+            timeout=_DEFAULT_TIMEOUT,
+            connector=aiohttp.TCPConnector(
+                limit=_MAX_CONNECTIONS,
+                limit_per_host=_MAX_CONNECTIONS_PER_HOST,
+                keepalive_timeout=_KEEPALIVE_TIMEOUT,
+                ttl_dns_cache=300
+            )
+        )
+    return _HTTP_SESSION
+
+
+async def close_http_session():
+    """Close the shared HTTP session (call on application shutdown)."""
+    global _HTTP_SESSION
+    if _HTTP_SESSION is not None:
+        await _HTTP_SESSION.close()
+        _HTTP_SESSION = None
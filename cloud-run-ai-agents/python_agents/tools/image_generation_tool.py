@@ -3,12 +3,110 @@ Image Generation Tool - Generates AI images using Gemini 2.5 Flash Image
 """
 
 import google.generativeai as genai
+from google.genai import Client, errors, types
 import os
-import json
+import logging
+import asyncio
+import base64
+import time
+from contextlib import nullcontext
 from datetime import datetime
+from typing import AsyncContextManager, List, Optional, TypedDict
 
+from .gcs_storage_tool import upload_image_to_gcs
+from ..gemini_config import require_api_key
+from .image_safety_tool import validate_image_bytes
+from .json_response import parse_json_response
+from .result_cache import TTLCache, cache_key
+from .writing_budget import trim_writing
 
-def generate_image_from_writing(
+logger = logging.getLogger(__name__)
+
+# Caps concurrent scene generations per process to stay within Gemini RPM quota
+_GENERATION_SEMAPHORE = asyncio.Semaphore(int(os.getenv("GEMINI_MAX_CONCURRENCY", 6)))
+
+
+class ImagePrompt(TypedDict):
+    """Response schema Gemini must follow for image prompt generation."""
+
+    prompt: str
+
+
+_PROMPT_GENERATION_CONFIG = genai.GenerationConfig(
+    response_mime_type="application/json",
+    response_schema=ImagePrompt
+)
+
+# Only used when USE_LLM_PROMPT_REWRITE is set
+_PROMPT_MODEL = genai.GenerativeModel(
+    "gemini-2.5-flash",
+    system_instruction="You are a creative AI generating visual prompts for children's stories.",
+    generation_config=_PROMPT_GENERATION_CONFIG
+)
+
+_IMAGE_CLIENT: Optional[Client] = None
+
+# Optional Vertex AI Provisioned Throughput for image generation. Requests are
+# marked dedicated so they never spill onto shared capacity; on quota or
+# server errors they fall back to the pay-as-you-go Gemini API, and after
+# repeated failures PT is skipped for a cooldown period
+_USE_PROVISIONED_THROUGHPUT = os.getenv("USE_PROVISIONED_THROUGHPUT", "false").lower() == "true"
+_PT_LOCATION = os.getenv("PT_LOCATION", "us-central1")
+_PT_BREAKER_THRESHOLD = 3
+_PT_BREAKER_COOLDOWN = 60
+
+_PT_CLIENT: Optional[Client] = None
+_PT_FAILURES = 0
+_PT_OPEN_UNTIL = 0.0
+
+# What each image index illustrates; indices past the end reuse the last one
+_SCENE_DESCRIPTIONS = (
+    "the opening scene or setting",
+    "a key moment or action in the middle",
+    "the climax or most exciting part",
+    "the resolution or ending",
+    "an important character or creature",
+    "a magical or special object mentioned"
+)
+
+_SAFETY_GUIDELINES = """
+Avoid: violence, scary imagery, adult themes, dark themes, weapons.
+Ensure: age-appropriate, educational, friendly characters, positive themes."""
+
+# Built once so every request sends byte-identical style blocks
+_STYLE_INSTRUCTIONS = {
+    "comic": f"""Create a HERO COMIC STYLE illustration with 3 to 4 comic panels.
+Style: Vibrant superhero comic book art, bold outlines, dynamic poses.
+Colors: Bright, bold, saturated colors.
+{_SAFETY_GUIDELINES}""",
+    "manga": f"""Create a BLACK AND WHITE MANGA STYLE illustration with 3 to 4 panels.
+Style: Japanese manga art, dramatic angles, expressive characters.
+Colors: BLACK AND WHITE only.
+{_SAFETY_GUIDELINES}""",
+    "princess": f"""Create a PRINCESS COMIC STYLE illustration with 3 to 4 panels.
+Style: Enchanting fairy tale comic art, delicate linework, magical atmosphere.
+Colors: Soft pastels, pinks, purples, golds, with sparkles.
+{_SAFETY_GUIDELINES}""",
+    "standard": f"""Create a colorful, child-friendly illustration.
+Style: whimsical, educational, vibrant colors, friendly characters.
+{_SAFETY_GUIDELINES}"""
+}
+
+# Image prompts are rendered locally from the story; set
+# USE_LLM_PROMPT_REWRITE=true to have Gemini write them instead (for A/B runs)
+_USE_LLM_PROMPT_REWRITE = os.getenv("USE_LLM_PROMPT_REWRITE", "false").lower() == "true"
+
+_IMAGE_PROMPT_TEMPLATE = """Illustrate {scene_desc} from this children's story (age {age_group}):
+
+{story}
+
+{style_instructions}"""
+
+# Image prompts for regenerated scenes (same story, index and style)
+_PROMPT_CACHE = TTLCache(maxsize=1_000, ttl=3600)
+
+
+async def generate_image_from_writing(
     student_writing: str,
     age_group: str,
     image_index: int,
@@ -38,37 +136,27 @@ def generate_image_from_writing(
             - error (str|None): Error message if generation failed
     """
     try:
-        print(f"\n🎨 [{datetime.utcnow().isoformat()}] Image Generation")
-        print(f"   Submission: {submission_id}, Index: {image_index}, Style: {image_style}")
+        logger.debug("🎨 Image Generation")
+        logger.debug("Submission: %s, Index: %s, Style: %s", submission_id, image_index, image_style)
 
         # Step 1: Generate image prompt
-        print(f"   📝 Step 1: Generating image prompt...")
-        prompt = _generate_image_prompt(student_writing, age_group, image_index, image_style)
+        logger.debug("📝 Step 1: Generating image prompt...")
+        prompt = await _generate_image_prompt(student_writing, age_group, image_index, image_style)
 
         if not prompt:
             raise Exception("Failed to generate image prompt")
 
-        print(f"   Prompt: {prompt[:100]}..." if len(prompt) > 100 else f"   Prompt: {prompt}")
+        logger.debug("Prompt: %.100s%s", prompt, "..." if len(prompt) > 100 else "")
 
         # Step 2: Generate image with Gemini 2.5 Flash Image
-        print(f"   🎨 Step 2: Generating image with Gemini...")
-
-        api_key = os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY")
-        if not api_key:
-            raise Exception("No API key found for Gemini")
+        logger.debug("🎨 Step 2: Generating image with Gemini...")
 
         try:
-            from google.genai import Client
-            from google.genai import types
-
-            client = Client(api_key=api_key)
-
             # Determine aspect ratio based on style
             aspect_ratio = "2:3" if image_style in ['comic', 'manga', 'princess'] else "16:9"
 
             # Generate image
-            response = client.models.generate_content(
-                model='gemini-2.5-flash-image',
+            response = await _generate_image_content(
                 contents=[prompt],
                 config=types.GenerateContentConfig(
                     image_config=types.ImageConfig(
@@ -85,28 +173,19 @@ def generate_image_from_writing(
             if not candidate.content or not candidate.content.parts:
                 raise Exception("Invalid response structure")
 
-            # Find inline image data
+            # Find inline image data; the SDK normally hands back decoded
+            # bytes, which are used as-is without another copy
             image_data = None
             for part in candidate.content.parts:
                 if part.inline_data is not None:
-                    import base64
                     data = part.inline_data.data
-
-                    if isinstance(data, str):
-                        image_data = base64.b64decode(data)
-                    elif isinstance(data, bytes):
-                        image_data = data
-                    else:
-                        try:
-                            image_data = bytes(data)
-                        except:
-                            image_data = base64.b64decode(str(data))
+                    image_data = base64.b64decode(data, validate=False) if isinstance(data, str) else data
                     break
 
             if not image_data:
                 raise Exception("No image data in response")
 
-            print(f"   ✅ Image generated ({len(image_data)} bytes)")
+            logger.info("✅ Image generated (%s bytes)", len(image_data))
 
             return {
                 "success": True,
@@ -118,11 +197,11 @@ def generate_image_from_writing(
             }
 
         except Exception as gemini_error:
-            print(f"❌ Gemini image generation error: {str(gemini_error)}")
+            logger.error("❌ Gemini image generation error: %s", gemini_error)
             raise Exception(f"Gemini API error: {str(gemini_error)}")
 
     except Exception as e:
-        print(f"❌ Image generation error: {str(e)}")
+        logger.error("❌ Image generation error: %s", e)
         return {
             "success": False,
             "error": str(e),
@@ -130,37 +209,201 @@ def generate_image_from_writing(
         }
 
 
-def _generate_image_prompt(
+async def generate_and_upload_image(
     student_writing: str,
     age_group: str,
     image_index: int,
-    image_style: str
-) -> str:
-    """Generate detailed image prompt using Gemini."""
-    scene_descriptions = [
-        "the opening scene or setting",
-        "a key moment or action in the middle",
-        "the climax or most exciting part",
-        "the resolution or ending",
-        "an important character or creature",
-        "a magical or special object mentioned"
+    image_style: str,
+    submission_id: str,
+    validate_safety: bool = False
+) -> dict:
+    """
+    Generate an image and upload it straight to GCS.
+
+    The image bytes go from the Gemini response to the upload and are not
+    handed back to the caller. With validate_safety the safety check runs on
+    the same bytes concurrently with the upload.
+
+    Args:
+        student_writing: The student's story text
+        age_group: Student's age group (e.g., "7-11", "11-14")
+        image_index: Which scene to illustrate (1, 2, 3, 4, 5, 6)
+        image_style: Visual style ("standard"|"comic"|"manga"|"princess")
+        submission_id: Submission identifier for tracking
+        validate_safety: Also run image safety validation
+
+    Returns:
+        dict: Result containing:
+            - success (bool): Whether generation and upload succeeded (and,
+              with validate_safety, the image passed)
+            - imageIndex (int): The scene index
+            - url (str): Public URL of the uploaded image
+            - filename (str): Storage filename
+            - size (int): File size in bytes
+            - prompt (str): The generated image prompt
+            - style (str): Image style used
+            - aspectRatio (str): Aspect ratio (e.g., "16:9", "2:3")
+            - safetyCheck (dict): Safety result, with validate_safety only
+            - error (str|None): Error message if a step failed
+    """
+    return await _generate_and_upload(
+        student_writing, age_group, image_index, image_style, submission_id,
+        nullcontext(), validate_safety
+    )
+
+
+async def _generate_and_upload(
+    student_writing: str,
+    age_group: str,
+    image_index: int,
+    image_style: str,
+    submission_id: str,
+    generation_slot: AsyncContextManager,
+    validate_safety: bool = False
+) -> dict:
+    """Generate inside generation_slot, then upload (and validate) outside it."""
+    async with generation_slot:
+        image_result = await generate_image_from_writing(
+            student_writing, age_group, image_index, image_style, submission_id
+        )
+
+    if not image_result["success"]:
+        return {**image_result, "imageIndex": image_index}
+
+    image_data = image_result.pop("image_data")
+    if validate_safety:
+        # Both stages only need the bytes, so neither waits for the other
+        upload_result, safety_result = await asyncio.gather(
+            upload_image_to_gcs(image_data, submission_id, image_index, "png"),
+            validate_image_bytes(image_data, age_group, student_writing[:200])
+        )
+    else:
+        upload_result = await upload_image_to_gcs(image_data, submission_id, image_index, "png")
+        safety_result = None
+
+    if not upload_result["success"]:
+        return {**upload_result, "imageIndex": image_index}
+
+    result = {
+        "success": True,
+        "imageIndex": image_index,
+        "url": upload_result["url"],
+        "filename": upload_result["filename"],
+        "size": upload_result["size"],
+        "prompt": image_result["prompt"],
+        "style": image_result["style"],
+        "aspectRatio": image_result["aspectRatio"],
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+    if safety_result is not None:
+        safety_result["imageUrl"] = upload_result["url"]
+        result["safetyCheck"] = safety_result
+        if not safety_result["isSafe"]:
+            result["success"] = False
+            result["error"] = "Image failed safety validation"
+
+    return result
+
+
+async def generate_images_for_submission(
+    student_writing: str,
+    age_group: str,
+    image_style: str,
+    submission_id: str,
+    indices: List[int],
+    validate_safety: bool = False
+) -> list:
+    """
+    Generate and upload several scene images for a submission concurrently.
+
+    Each scene is generated under a shared concurrency limit and uploaded to
+    GCS (and safety-validated, if requested) as soon as it is ready, so
+    uploads and validations overlap the remaining generations.
+    A failed scene does not fail the others.
+
+    Args:
+        student_writing: The student's story text
+        age_group: Student's age group (e.g., "7-11", "11-14")
+        image_style: Visual style ("standard"|"comic"|"manga"|"princess")
+        submission_id: Submission identifier for tracking
+        indices: Scene indices to illustrate (e.g., [1, 2, 3])
+        validate_safety: Also run image safety validation on each scene
+
+    Returns:
+        list[dict]: One result per index, in the same order, containing:
+            - success (bool): Whether generation and upload succeeded
+            - imageIndex (int): The scene index
+            - url (str): Public URL of the uploaded image
+            - filename (str): Storage filename
+            - prompt (str): The generated image prompt
+            - style (str): Image style used
+            - aspectRatio (str): Aspect ratio (e.g., "16:9", "2:3")
+            - safetyCheck (dict): Safety result, with validate_safety only
+            - error (str|None): Error message if this scene failed
+    """
+    logger.debug("🎨 Batch Image Generation")
+    logger.debug("Submission: %s, Scenes: %s, Style: %s", submission_id, list(indices), image_style)
+
+    results = await asyncio.gather(
+        *(
+            _generate_and_upload(
+                student_writing, age_group, i, image_style, submission_id,
+                _GENERATION_SEMAPHORE, validate_safety
+            )
+            for i in indices
+        ),
+        return_exceptions=True
+    )
+
+    # Keep partial success: report failed scenes instead of raising
+    results = [
+        {
+            "success": False,
+            "imageIndex": image_index,
+            "error": str(result),
+            "timestamp": datetime.utcnow().isoformat()
+        } if isinstance(result, Exception) else result
+        for image_index, result in zip(indices, results)
     ]
 
-    scene_desc = scene_descriptions[min(image_index - 1, len(scene_descriptions) - 1)]
+    succeeded = sum(1 for result in results if result["success"])
+    logger.info("✅ %s/%s images generated and uploaded", succeeded, len(results))
+
+    return results
+
+
+async def _generate_image_prompt(
+    student_writing: str,
+    age_group: str,
+    image_index: int,
+    image_style: str
+) -> str:
+    """Generate detailed image prompt, rendered locally or (if enabled) by Gemini."""
+    scene_desc = _SCENE_DESCRIPTIONS[min(image_index - 1, len(_SCENE_DESCRIPTIONS) - 1)]
     style_instructions = _get_style_instructions(image_style)
 
-    api_key = os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY")
-    genai.configure(api_key=api_key)
+    story, _ = trim_writing(student_writing)
 
-    model = genai.GenerativeModel(
-        "gemini-2.5-flash",
-        system_instruction="You are a creative AI generating visual prompts for children's stories."
-    )
+    if not _USE_LLM_PROMPT_REWRITE:
+        return _IMAGE_PROMPT_TEMPLATE.format(
+            scene_desc=scene_desc,
+            age_group=age_group,
+            story=story,
+            style_instructions=style_instructions
+        )
+
+    prompt_key = cache_key(story, age_group, image_index, image_style)
+    cached = _PROMPT_CACHE.get(prompt_key)
+    if cached is not None:
+        return cached
+
+    require_api_key()
 
     prompt_request = f"""Based on this student story (Age: {age_group}), generate a detailed visual prompt for image #{image_index} focusing on {scene_desc}:
 
 Story:
-"{student_writing}"
+"{story}"
 
 {style_instructions}
 
@@ -171,46 +414,71 @@ Respond with JSON:
   "prompt": "Detailed image prompt here..."
 }}"""
 
-    response = model.generate_content(prompt_request)
-    response_text = response.text.strip()
+    response = await _PROMPT_MODEL.generate_content_async(prompt_request)
 
-    # Clean markdown
-    if response_text.startswith('```json'):
-        response_text = response_text[7:]
-    elif response_text.startswith('```'):
-        response_text = response_text[3:]
-    if response_text.endswith('```'):
-        response_text = response_text[:-3]
+    result = parse_json_response(response.text)
+    prompt = result.get("prompt", "")
+    if prompt:
+        _PROMPT_CACHE.set(prompt_key, prompt)
+    return prompt
 
-    result = json.loads(response_text.strip())
-    return result.get("prompt", "")
 
+def _get_image_client() -> Client:
+    """Return the google-genai client used for image generation."""
+    global _IMAGE_CLIENT
 
-def _get_style_instructions(image_style: str) -> str:
-    """Get style-specific instructions."""
-    safety_guidelines = """
-Avoid: violence, scary imagery, adult themes, dark themes, weapons.
-Ensure: age-appropriate, educational, friendly characters, positive themes."""
+    if _IMAGE_CLIENT is None:
+        _IMAGE_CLIENT = Client(api_key=require_api_key())
 
-    if image_style == "comic":
-        return f"""Create a HERO COMIC STYLE illustration with 3 to 4 comic panels.
-Style: Vibrant superhero comic book art, bold outlines, dynamic poses.
-Colors: Bright, bold, saturated colors.
-{safety_guidelines}"""
+    return _IMAGE_CLIENT
 
-    elif image_style == "manga":
-        return f"""Create a BLACK AND WHITE MANGA STYLE illustration with 3 to 4 panels.
-Style: Japanese manga art, dramatic angles, expressive characters.
-Colors: BLACK AND WHITE only.
-{safety_guidelines}"""
 
-    elif image_style == "princess":
-        return f"""Create a PRINCESS COMIC STYLE illustration with 3 to 4 panels.
-Style: Enchanting fairy tale comic art, delicate linework, magical atmosphere.
-Colors: Soft pastels, pinks, purples, golds, with sparkles.
-{safety_guidelines}"""
+def _get_pt_client() -> Client:
+    """Return the Vertex AI client bound to Provisioned Throughput."""
+    global _PT_CLIENT
 
-    else:  # standard
-        return f"""Create a colorful, child-friendly illustration.
-Style: whimsical, educational, vibrant colors, friendly characters.
-{safety_guidelines}"""
+    if _PT_CLIENT is None:
+        _PT_CLIENT = Client(
+            vertexai=True,
+            project=os.getenv("GCP_PROJECT_ID"),
+            location=_PT_LOCATION,
+            http_options=types.HttpOptions(
+                base_url=os.getenv("PT_ENDPOINT") or None,
+                headers={"X-Vertex-AI-LLM-Request-Type": "dedicated"}
+            )
+        )
+
+    return _PT_CLIENT
+
+
+async def _generate_image_content(**kwargs) -> types.GenerateContentResponse:
+    """Generate an image, preferring Provisioned Throughput when enabled."""
+    global _PT_FAILURES, _PT_OPEN_UNTIL
+
+    if _USE_PROVISIONED_THROUGHPUT and time.monotonic() >= _PT_OPEN_UNTIL:
+        try:
+            response = await _get_pt_client().aio.models.generate_content(
+                model='gemini-2.5-flash-image', **kwargs
+            )
+            _PT_FAILURES = 0
+            return response
+        except errors.APIError as e:
+            # Bad requests would fail the same way on pay-as-you-go
+            if e.code != 429 and e.code < 500:
+                raise
+            _PT_FAILURES += 1
+            if _PT_FAILURES >= _PT_BREAKER_THRESHOLD:
+                _PT_OPEN_UNTIL = time.monotonic() + _PT_BREAKER_COOLDOWN
+                _PT_FAILURES = 0
+                logger.warning("⚠️  Provisioned Throughput failing, using pay-as-you-go for %ss", _PT_BREAKER_COOLDOWN)
+            else:
+                logger.warning("⚠️  Provisioned Throughput unavailable (%s), falling back to pay-as-you-go", e.code)
+
+    return await _get_image_client().aio.models.generate_content(
+        model='gemini-2.5-flash-image', **kwargs
+    )
+
+
+def _get_style_instructions(image_style: str) -> str:
+    """Get style-specific instructions."""
+    return _STYLE_INSTRUCTIONS.get(image_style, _STYLE_INSTRUCTIONS["standard"])
@@ -3,15 +3,90 @@ Image Safety Validation Tool - Validates images using Gemini vision
 """
 
 import google.generativeai as genai
-import os
-import json
-import requests
+import logging
 from datetime import datetime
-from PIL import Image
-import io
+from typing import Annotated, List, Optional
+from pydantic import AfterValidator, BaseModel, Field, ValidationError
 
+from ..gemini_config import require_api_key
+from .http_session import get_http_session
+from .json_response import parse_json_response
+from .result_cache import TTLCache, cache_key
 
-def validate_image_safety(
+logger = logging.getLogger(__name__)
+
+
+_RISK_LEVELS = frozenset({"none", "low", "medium", "high", "critical"})
+_RECOMMENDATIONS = frozenset({"approve", "review", "regenerate", "block"})
+
+
+def _check_risk_level(value: str) -> str:
+    """Reject risk levels outside the documented set."""
+    if value not in _RISK_LEVELS:
+        raise ValueError(f"unknown risk level {value!r}")
+    return value
+
+
+def _check_recommendation(value: str) -> str:
+    """Reject recommendations outside the documented set."""
+    if value not in _RECOMMENDATIONS:
+        raise ValueError(f"unknown recommendation {value!r}")
+    return value
+
+
+# Allowed values are stated in the schema description and enforced on parse,
+# like the feedback tool's score ranges
+RiskLevel = Annotated[
+    str,
+    Field(description="One of: none, low, medium, high, critical"),
+    AfterValidator(_check_risk_level)
+]
+Recommendation = Annotated[
+    str,
+    Field(description="One of: approve, review, regenerate, block"),
+    AfterValidator(_check_recommendation)
+]
+
+
+class ImageSafetyIssue(BaseModel):
+    """One safety problem found in the image."""
+
+    category: str
+    severity: str
+    description: str
+    location: str
+
+
+class ImageSafetyResult(BaseModel):
+    """Response schema Gemini must follow for image safety analysis."""
+
+    isSafe: bool
+    riskLevel: RiskLevel
+    issues: List[ImageSafetyIssue]
+    recommendation: Recommendation
+    reasoning: str
+    visualDescription: str
+
+
+_GENERATION_CONFIG = genai.GenerationConfig(
+    response_mime_type="application/json",
+    response_schema=ImageSafetyResult
+)
+
+_SAFETY_MODEL = genai.GenerativeModel(
+    "gemini-2.5-flash",
+    system_instruction="You are an image content safety moderator for a children's educational platform.",
+    generation_config=_GENERATION_CONFIG
+)
+
+# Images that passed, keyed on the image bytes and age group and kept for a
+# week whatever the story context, so regenerate loops that return an image
+# already cleared skip the vision call. Flagged images are never cached, so
+# they always get a fresh check
+_RESULT_CACHE = TTLCache(maxsize=10_000, ttl=7 * 86400)
+
+
+async def validate_image_safety(
     image_url: str,
     age_group: str,
     context: str = ""
@@ -38,29 +113,59 @@ def validate_image_safety(
             - error (str|None): Error message if validation failed
     """
     try:
-        print(f"\n🛡️  [{datetime.utcnow().isoformat()}] Image Safety Validation")
-        print(f"   Image URL: {image_url}")
-        print(f"   Age Group: {age_group}")
+        logger.debug("🛡️  Image Safety Validation")
+        logger.debug("Image URL: %s", image_url)
 
         # Download image
-        print(f"   📥 Downloading image...")
-        response = requests.get(image_url, timeout=30)
-        response.raise_for_status()
-        image_data = response.content
-
-        # Open with PIL
-        pil_image = Image.open(io.BytesIO(image_data))
-
-        # Configure Gemini
-        api_key = os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY")
-        if not api_key:
-            raise Exception("No API key found for Gemini")
-
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel(
-            "gemini-2.5-flash",
-            system_instruction="You are an image content safety moderator for a children's educational platform."
-        )
+        logger.debug("📥 Downloading image...")
+        async with get_http_session().get(image_url) as response:
+            response.raise_for_status()
+            image_data = await response.read()
+            mime_type = response.content_type if response.content_type.startswith("image/") else "image/png"
+
+    except Exception as e:
+        logger.error("❌ Image download error: %s", e)
+        return _error_result(e)
+
+    return await validate_image_bytes(image_data, age_group, context, image_url, mime_type)
+
+
+async def validate_image_bytes(
+    image_data: bytes,
+    age_group: str,
+    context: str = "",
+    image_url: Optional[str] = None,
+    mime_type: str = "image/png"
+) -> dict:
+    """
+    Validate raw image bytes for safety, e.g. a freshly generated image.
+
+    Lets the check run alongside the upload instead of downloading the
+    image again afterwards. Returns the same result as validate_image_safety.
+
+    Args:
+        image_data: Image bytes to validate
+        age_group: Target age group (e.g., "7-11", "11-14")
+        context: Optional story context for better validation
+        image_url: Optional URL of the image, echoed in the result
+        mime_type: MIME type of image_data
+    """
+    try:
+        logger.debug("Age Group: %s", age_group)
+
+        result_key = cache_key(image_data, age_group)
+        cached = _RESULT_CACHE.get(result_key)
+        if cached is not None and cached["isSafe"]:
+            logger.debug("♻️  Reusing cached verdict for identical image")
+            # Callers annotate the result, so never hand out the cached dict
+            return {
+                **cached,
+                "issues": list(cached["issues"]),
+                "imageUrl": image_url,
+                "timestamp": datetime.utcnow().isoformat()
+            }
+
+        require_api_key()
 
         # Create safety validation prompt
         context_text = f"\n\nStory context: {context}" if context else ""
@@ -95,29 +200,18 @@ Respond with ONLY valid JSON in this EXACT format:
 }}"""
 
         # Call Gemini with image
-        print(f"   🤖 Analyzing with Gemini vision...")
-        response = model.generate_content([prompt, pil_image])
-        response_text = response.text.strip()
-
-        # Clean markdown
-        if response_text.startswith('```json'):
-            response_text = response_text[7:]
-        elif response_text.startswith('```'):
-            response_text = response_text[3:]
-        if response_text.endswith('```'):
-            response_text = response_text[:-3]
+        logger.debug("🤖 Analyzing with Gemini vision...")
+        # Raw bytes go over the wire as-is; no decode/re-encode through PIL
+        response = await _SAFETY_MODEL.generate_content_async(
+            [prompt, {"mime_type": mime_type, "data": image_data}]
+        )
 
-        # Parse JSON
-        result = json.loads(response_text.strip())
+        # A missing field or unknown value fails closed below
+        result = parse_json_response(response.text, ImageSafetyResult)
 
         # Build safety result
         safety_result = {
-            "isSafe": result.get("isSafe", True),
-            "riskLevel": result.get("riskLevel", "none"),
-            "issues": result.get("issues", []),
-            "recommendation": result.get("recommendation", "approve"),
-            "reasoning": result.get("reasoning", "Image appears appropriate"),
-            "visualDescription": result.get("visualDescription", ""),
+            **result.model_dump(),
             "alertMessage": None,
             "imageUrl": image_url,
             "timestamp": datetime.utcnow().isoformat()
@@ -131,32 +225,38 @@ Respond with ONLY valid JSON in this EXACT format:
             )
 
         status = "✅ SAFE" if safety_result["isSafe"] else "⚠️  UNSAFE"
-        print(f"   {status}: {safety_result['riskLevel']} - {safety_result['recommendation']}")
+        logger.info("%s: %s - %s", status, safety_result['riskLevel'], safety_result['recommendation'])
 
+        if safety_result["isSafe"]:
+            _RESULT_CACHE.set(result_key, {**safety_result, "issues": list(safety_result["issues"])})
         return safety_result
 
-    except json.JSONDecodeError as e:
-        print(f"❌ JSON parse error: {str(e)}")
-        return {
-            "isSafe": False,
-            "riskLevel": "unknown",
-            "issues": [],
-            "recommendation": "review",
-            "reasoning": "Safety validation failed due to parsing error",
-            "alertMessage": "⚠️ Unable to verify image safety. Manual review required.",
-            "error": str(e),
-            "timestamp": datetime.utcnow().isoformat()
-        }
+    except ValidationError as e:
+        logger.error("❌ Safety result parse error: %s", e)
+        return _error_result(
+            e,
+            reasoning="Safety validation failed due to parsing error",
+            alert_message="⚠️ Unable to verify image safety. Manual review required."
+        )
 
     except Exception as e:
-        print(f"❌ Image safety validation error: {str(e)}")
-        return {
-            "isSafe": False,
-            "riskLevel": "unknown",
-            "issues": [],
-            "recommendation": "review",
-            "reasoning": f"Safety validation encountered an error: {str(e)}",
-            "alertMessage": "⚠️ Safety check temporarily unavailable. Manual review required.",
-            "error": str(e),
-            "timestamp": datetime.utcnow().isoformat()
-        }
+        logger.error("❌ Image safety validation error: %s", e)
+        return _error_result(e)
+
+
+def _error_result(
+    error: Exception,
+    reasoning: Optional[str] = None,
+    alert_message: str = "⚠️ Safety check temporarily unavailable. Manual review required."
+) -> dict:
+    """Build the fail-closed result returned when validation can't complete."""
+    return {
+        "isSafe": False,
+        "riskLevel": "unknown",
+        "issues": [],
+        "recommendation": "review",
+        "reasoning": reasoning or f"Safety validation encountered an error: {str(error)}",
+        "alertMessage": alert_message,
+        "error": str(error),
+        "timestamp": datetime.utcnow().isoformat()
+    }
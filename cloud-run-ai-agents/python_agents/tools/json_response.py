@@ -0,0 +1,36 @@
+"""
+JSON Response - Parses JSON-mode Gemini responses for every tool
+"""
+
+import json
+import re
+from typing import Any, Optional, Type
+
+from pydantic import BaseModel
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:  # optional; the stdlib parser works, just slower
+    _json_loads = json.loads
+
+# JSON mode returns bare JSON; this only catches responses that still
+# arrive wrapped in a markdown code fence
+_FENCE_RE = re.compile(r"^```(?:json)?\s*|\s*```$")
+
+
+def parse_json_response(text: str, model: Optional[Type[BaseModel]] = None) -> Any:
+    """
+    Parse the text of a JSON-mode Gemini response.
+
+    Args:
+        text: Response text
+        model: Optional pydantic model to validate the JSON against
+
+    Returns:
+        The model instance when model is given, otherwise the decoded JSON
+    """
+    body = _FENCE_RE.sub("", text.strip())
+    if model is not None:
+        return model.model_validate_json(body)
+    return _json_loads(body)
@@ -3,13 +3,94 @@ Video Generation Tool - Generates AI videos using Veo 3.1
 """
 
 import os
-import json
+import logging
+import random
 import time
+import asyncio
 from datetime import datetime
+from typing import AsyncIterator, Optional, Tuple, TypedDict
+import aiohttp
 import google.generativeai as genai
+from google.genai import Client, errors, types
 
+from .gcs_storage_tool import upload_video_stream_to_gcs
+from ..gemini_config import require_api_key
+from .http_session import get_http_session
+from .json_response import parse_json_response
+from .result_cache import InFlight, TTLCache, cache_key
 
-def generate_video_from_writing(
+logger = logging.getLogger(__name__)
+
+# Veo jobs take anywhere from seconds to minutes: poll quickly at first and
+# back off so short jobs return promptly and long ones poll less often.
+# The Gemini API has no blocking wait for operations, so delays use
+# decorrelated jitter to keep concurrent jobs from polling in lockstep
+_POLL_INITIAL_DELAY = 1
+_POLL_MAX_DELAY = 15
+_GENERATION_TIMEOUT = 600
+
+_VEO_MODEL = "veo-3.1-fast-generate-preview"
+_VIDEO_DURATION = 8  # Veo 3.1 default duration, in seconds
+_VEO_CLIENT: Optional[Client] = None
+
+# Caps in-flight Veo jobs per process to stay within the Veo quota; extra
+# requests wait their turn instead of failing with quota errors
+_VEO_SEMAPHORE = asyncio.Semaphore(int(os.getenv("VEO_MAX_CONCURRENCY", 4)))
+
+# After repeated auth or quota errors, video requests fail fast for a
+# cooldown instead of spending a Gemini prompt call and a Veo submission
+# on a request that is bound to be rejected
+_BREAKER_ERROR_CODES = frozenset({401, 403, 429})
+_BREAKER_THRESHOLD = 5
+_BREAKER_COOLDOWN = 60
+
+_BREAKER_FAILURES = 0
+_BREAKER_OPEN_UNTIL = 0.0
+
+# Veo jobs in progress, keyed on the prompt: an identical request made while
+# one is running waits for that job instead of starting another. With the
+# prompt cache below, resubmitting the same story yields the same prompt.
+_IN_FLIGHT = InFlight()
+
+# Generated videos are streamed to GCS in 1 MiB reads; the timeout covers
+# the whole download rather than the session's default 30s
+_DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+_DOWNLOAD_TIMEOUT = aiohttp.ClientTimeout(total=300)
+
+
+class VideoPrompt(TypedDict):
+    """Response schema Gemini must follow for video prompt generation."""
+
+    videoActionPrompt: str
+
+
+_PROMPT_GENERATION_CONFIG = genai.GenerationConfig(
+    response_mime_type="application/json",
+    response_schema=VideoPrompt
+)
+
+_PROMPT_MODEL = genai.GenerativeModel(
+    "gemini-2.5-flash",
+    system_instruction="You are a creative AI generating video prompts for children's stories.",
+    generation_config=_PROMPT_GENERATION_CONFIG
+)
+
+# Built once so every request sends byte-identical style blocks
+_STYLE_BLOCKS = {
+    "cinematic": """
+This will be CINEMATIC LIVE-ACTION style.
+Focus on realistic camera movements, professional cinematography, natural lighting.""",
+    "animation": """
+This will be ANIMATED style.
+Focus on colorful, playful animation with smooth character movement and fun visuals."""
+}
+
+# Video prompts for resubmitted stories, keyed on the case- and
+# whitespace-normalized text so trivial edits still hit
+_PROMPT_CACHE = TTLCache(maxsize=1_000, ttl=3600)
+
+
+async def generate_video_from_writing(
     student_writing: str,
     age_group: str,
     video_style: str,
@@ -35,127 +116,249 @@ def generate_video_from_writing(
             - duration (int): Video duration in seconds
             - error (str|None): Error message if generation failed
     """
+    # One timestamp per request, shared by the log and the result
+    timestamp = datetime.utcnow().isoformat()
+
     try:
-        print(f"\n🎬 [{datetime.utcnow().isoformat()}] Video Generation")
-        print(f"   Submission: {submission_id}, Style: {video_style}")
+        logger.debug("🎬 Video Generation at %s", timestamp)
+        logger.debug("Submission: %s, Style: %s", submission_id, video_style)
 
-        # Step 1: Generate video prompt
-        print(f"   📝 Step 1: Generating video prompt...")
-        prompt = _generate_video_prompt(student_writing, age_group, video_style)
+        prompt, generated_video = await _generate_video(student_writing, age_group, video_style)
 
-        if not prompt:
-            raise Exception("Failed to generate video prompt")
+        try:
+            # Download video data
+            logger.debug("📥 Downloading video...")
+            # download() returns the bytes (and keeps them on the Video);
+            # a joined in-flight job may already have fetched them
+            video_data = generated_video.video.video_bytes or await _get_veo_client().aio.files.download(
+                file=generated_video.video
+            )
 
-        print(f"   Prompt: {prompt[:100]}..." if len(prompt) > 100 else f"   Prompt: {prompt}")
+        except Exception as veo_error:
+            logger.error("❌ Veo download error: %s", veo_error)
+            raise Exception(f"Veo API error: {str(veo_error)}")
 
-        # Step 2: Generate video with Veo 3.1
-        print(f"   🎬 Step 2: Generating video with Veo 3.1...")
+        logger.info("✅ Video downloaded (%s bytes)", len(video_data))
 
-        api_key = os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY")
-        if not api_key:
-            raise Exception("No API key found for Veo")
+        return {
+            "success": True,
+            "video_data": video_data,
+            "prompt": prompt,
+            "duration": _VIDEO_DURATION,
+            "timestamp": timestamp
+        }
 
-        try:
-            from google.genai import Client
+    except Exception as e:
+        logger.error("❌ Video generation error: %s", e)
+        return {
+            "success": False,
+            "error": str(e),
+            "timestamp": timestamp
+        }
+
+
+async def generate_and_upload_video(
+    student_writing: str,
+    age_group: str,
+    video_style: str,
+    submission_id: str
+) -> dict:
+    """
+    Generate a video with Veo 3.1 and stream it straight into GCS.
 
-            client = Client(api_key=api_key)
+    The video is copied from the Veo download to a resumable GCS upload one
+    chunk at a time, so it is never held in memory whole.
+
+    Args:
+        student_writing: The student's story text
+        age_group: Student's age group (e.g., "7-11", "11-14")
+        video_style: Animation style ("animation"|"cinematic")
+        submission_id: Submission identifier for tracking
+
+    Returns:
+        dict: Result containing:
+            - success (bool): Whether generation and upload succeeded
+            - url (str): Public URL of the uploaded video
+            - filename (str): Storage filename
+            - size (int): File size in bytes
+            - prompt (str): The generated video prompt
+            - duration (int): Video duration in seconds
+            - error (str|None): Error message if generation or upload failed
+    """
+    # One timestamp per request, shared by the log and the result
+    timestamp = datetime.utcnow().isoformat()
 
+    try:
+        logger.debug("🎬 Video Generation at %s", timestamp)
+        logger.debug("Submission: %s, Style: %s", submission_id, video_style)
+
+        prompt, generated_video = await _generate_video(student_writing, age_group, video_style)
+
+        logger.debug("📤 Streaming video to GCS...")
+        upload_result = await upload_video_stream_to_gcs(
+            _stream_video(generated_video.video), submission_id, "mp4"
+        )
+        if not upload_result["success"]:
+            return upload_result
+
+        logger.info("✅ Video uploaded (%s bytes)", upload_result["size"])
+
+        return {
+            "success": True,
+            "url": upload_result["url"],
+            "filename": upload_result["filename"],
+            "size": upload_result["size"],
+            "prompt": prompt,
+            "duration": _VIDEO_DURATION,
+            "timestamp": timestamp
+        }
+
+    except Exception as e:
+        logger.error("❌ Video generation error: %s", e)
+        return {
+            "success": False,
+            "error": str(e),
+            "timestamp": timestamp
+        }
+
+
+async def _generate_video(
+    student_writing: str,
+    age_group: str,
+    video_style: str
+) -> Tuple[str, types.GeneratedVideo]:
+    """Write the video prompt and run the Veo job; return the prompt and video."""
+    if time.monotonic() < _BREAKER_OPEN_UNTIL:
+        raise Exception("Veo quota exhausted or access denied; try again shortly")
+
+    client = _get_veo_client()
+
+    # Step 1: Generate video prompt
+    logger.debug("📝 Step 1: Generating video prompt...")
+    prompt = await _generate_video_prompt(student_writing, age_group, video_style)
+
+    if not prompt:
+        raise Exception("Failed to generate video prompt")
+
+    logger.debug("Prompt: %.100s%s", prompt, "..." if len(prompt) > 100 else "")
+
+    # Step 2: Generate video with Veo 3.1
+    logger.debug("🎬 Step 2: Generating video with Veo 3.1...")
+
+    key = cache_key(_VEO_MODEL, prompt)
+    if key in _IN_FLIGHT:
+        logger.debug("♻️  Joining in-flight Veo job")
+    return prompt, await _IN_FLIGHT.run(key, lambda: _run_veo_job(client, prompt))
+
+
+async def _run_veo_job(client: Client, prompt: str) -> types.GeneratedVideo:
+    """Run a Veo job for the prompt and return the generated video."""
+    global _BREAKER_FAILURES, _BREAKER_OPEN_UNTIL
+
+    try:
+        async with _VEO_SEMAPHORE:
             # Start video generation
-            operation = client.models.generate_videos(
-                model="veo-3.1-fast-generate-preview",
+            operation = await client.aio.models.generate_videos(
+                model=_VEO_MODEL,
                 prompt=prompt,
             )
 
-            print(f"   ⏳ Video generation started...")
+            logger.debug("⏳ Video generation started...")
 
-            # Poll for completion
-            poll_count = 0
-            max_polls = 120  # 10 minutes max
+            # Poll for completion without blocking the event loop
+            started = time.monotonic()
+            delay = _POLL_INITIAL_DELAY
 
             while not operation.done:
-                if poll_count >= max_polls:
+                elapsed = time.monotonic() - started
+                if elapsed >= _GENERATION_TIMEOUT:
                     raise Exception("Video generation timed out after 10 minutes")
 
-                print(f"   ⏳ Waiting... ({poll_count + 1}/{max_polls})")
-                time.sleep(5)
-                operation = client.operations.get(operation)
-                poll_count += 1
+                logger.debug("⏳ Waiting... (%.0fs elapsed)", elapsed)
+                await asyncio.sleep(delay)
+                delay = min(_POLL_MAX_DELAY, random.uniform(_POLL_INITIAL_DELAY, delay * 3))
+                operation = await client.aio.operations.get(operation)
 
-            print(f"   ✅ Video generation completed after {poll_count * 5} seconds")
+        _BREAKER_FAILURES = 0
+        logger.info("✅ Video generation completed after %.0f seconds", time.monotonic() - started)
 
-            # Download video
-            if not hasattr(operation, 'response') or not hasattr(operation.response, 'generated_videos'):
-                raise Exception("Invalid operation response")
+        if not hasattr(operation, 'response') or not hasattr(operation.response, 'generated_videos'):
+            raise Exception("Invalid operation response")
 
-            if not operation.response.generated_videos:
-                raise Exception("No videos generated")
+        if not operation.response.generated_videos:
+            raise Exception("No videos generated")
 
-            generated_video = operation.response.generated_videos[0]
+        return operation.response.generated_videos[0]
 
-            # Download video data
-            print(f"   📥 Downloading video...")
-            video_file = client.files.download(file=generated_video.video)
-
-            # Get video bytes
-            if hasattr(video_file, 'read'):
-                video_data = video_file.read()
-            elif hasattr(video_file, 'content'):
-                video_data = video_file.content
-            else:
-                import tempfile
-                with tempfile.NamedTemporaryFile(suffix=".mp4", delete=False) as tmp:
-                    generated_video.video.save(tmp.name)
-                    tmp.seek(0)
-                    video_data = tmp.read()
-
-            print(f"   ✅ Video downloaded ({len(video_data)} bytes)")
-
-            return {
-                "success": True,
-                "video_data": video_data,
-                "prompt": prompt,
-                "duration": 8,  # Veo 3.1 default duration
-                "timestamp": datetime.utcnow().isoformat()
-            }
+    except Exception as veo_error:
+        if isinstance(veo_error, errors.APIError) and veo_error.code in _BREAKER_ERROR_CODES:
+            _BREAKER_FAILURES += 1
+            if _BREAKER_FAILURES >= _BREAKER_THRESHOLD:
+                _BREAKER_OPEN_UNTIL = time.monotonic() + _BREAKER_COOLDOWN
+                _BREAKER_FAILURES = 0
+                logger.warning("⚠️  Veo rejecting requests, failing fast for %ss", _BREAKER_COOLDOWN)
+        logger.error("❌ Veo generation error: %s", veo_error)
+        raise Exception(f"Veo API error: {str(veo_error)}")
 
-        except Exception as veo_error:
-            print(f"❌ Veo generation error: {str(veo_error)}")
-            raise Exception(f"Veo API error: {str(veo_error)}")
 
-    except Exception as e:
-        print(f"❌ Video generation error: {str(e)}")
-        return {
-            "success": False,
-            "error": str(e),
-            "timestamp": datetime.utcnow().isoformat()
-        }
+async def _stream_video(video: types.Video) -> AsyncIterator[bytes]:
+    """Yield a generated video's bytes in chunks as they download."""
+    if video.video_bytes:
+        yield video.video_bytes
+        return
 
+    async with get_http_session().get(
+        video.uri,
+        headers={"x-goog-api-key": require_api_key()},
+        timeout=_DOWNLOAD_TIMEOUT
+    ) as response:
+        response.raise_for_status()
+        async for chunk in response.content.iter_chunked(_DOWNLOAD_CHUNK_SIZE):
+            yield chunk
 
-def _generate_video_prompt(student_writing: str, age_group: str, video_style: str) -> str:
-    """Generate detailed video prompt using Gemini."""
-    style_instructions = ""
-    if video_style == "cinematic":
-        style_instructions = """
-This will be CINEMATIC LIVE-ACTION style.
-Focus on realistic camera movements, professional cinematography, natural lighting."""
-    else:
-        style_instructions = """
-This will be ANIMATED style.
-Focus on colorful, playful animation with smooth character movement and fun visuals."""
 
-    api_key = os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY")
-    genai.configure(api_key=api_key)
+def _get_veo_client() -> Client:
+    """Return the google-genai client used for Veo."""
+    global _VEO_CLIENT
 
-    model = genai.GenerativeModel(
-        "gemini-2.5-flash",
-        system_instruction="You are a creative AI generating video prompts for children's stories."
-    )
+    if _VEO_CLIENT is None:
+        _VEO_CLIENT = Client(api_key=require_api_key())
 
-    prompt_request = f"""Based on this student story, create a video prompt for {video_style} style (Age: {age_group}):
+    return _VEO_CLIENT
+
+
+def _draft_style_block(video_style: str) -> str:
+    """Return the style instructions for a video style."""
+    return _STYLE_BLOCKS.get(video_style, _STYLE_BLOCKS["animation"])
+
+
+async def _generate_video_prompt(student_writing: str, age_group: str, video_style: str) -> str:
+    """Generate detailed video prompt using Gemini."""
+    prompt_key = cache_key(video_style, age_group, " ".join(student_writing.lower().split()))
+    cached = _PROMPT_CACHE.get(prompt_key)
+    if cached is not None:
+        logger.debug("♻️  Reusing cached video prompt")
+        return cached
+
+    style_instructions = _draft_style_block(video_style)
+    prompt = await _call_gemini_for_action(student_writing, age_group, video_style, style_instructions)
+    if prompt:
+        _PROMPT_CACHE.set(prompt_key, prompt)
+    return prompt
 
-Story:
-"{student_writing}"
 
+async def _call_gemini_for_action(
+    student_writing: str,
+    age_group: str,
+    video_style: str,
+    style_instructions: str
+) -> str:
+    """Ask Gemini for the video action prompt."""
+    require_api_key()
+
+    # Everything that is the same for a given style comes first and the
+    # story last, so consecutive requests share the longest possible prefix
+    prompt_request = f"""Create a video prompt for {video_style} style based on the student story below.
 {style_instructions}
 
 Create a detailed, vivid video prompt that captures the essence of the story in {video_style} style.
@@ -163,18 +366,12 @@ Create a detailed, vivid video prompt that captures the essence of the story in
 Respond with JSON:
 {{
   "videoActionPrompt": "Detailed action prompt for video..."
-}}"""
+}}
 
-    response = model.generate_content(prompt_request)
-    response_text = response.text.strip()
-
-    # Clean markdown
-    if response_text.startswith('```json'):
-        response_text = response_text[7:]
-    elif response_text.startswith('```'):
-        response_text = response_text[3:]
-    if response_text.endswith('```'):
-        response_text = response_text[:-3]
+Story (Age: {age_group}):
+"{student_writing}"
+"""
 
-    result = json.loads(response_text.strip())
+    response = await _PROMPT_MODEL.generate_content_async(prompt_request)
+    result = parse_json_response(response.text)
     return result.get("videoActionPrompt", "")
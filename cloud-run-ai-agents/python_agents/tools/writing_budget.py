@@ -0,0 +1,34 @@
+"""
+Writing Budget - Bounds the student writing sent to Gemini
+"""
+
+import os
+import re
+from typing import Tuple
+
+# Long submissions are sent as their opening, cut at a sentence end. The
+# rubric and the image prompts only need local context, so the rest just
+# adds tokens and latency
+WRITING_MAX_WORDS = int(os.getenv("WRITING_MAX_WORDS", 2000))
+
+_SENTENCE_BREAK_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+def trim_writing(student_writing: str, max_words: int = WRITING_MAX_WORDS) -> Tuple[str, bool]:
+    """Cut writing to the word budget at a sentence end; also report whether it was cut."""
+    if len(student_writing.split()) <= max_words:
+        return student_writing, False
+
+    cut = 0
+    words = 0
+    start = 0
+    for match in _SENTENCE_BREAK_RE.finditer(student_writing):
+        words += len(student_writing[start:match.start()].split())
+        if words > max_words:
+            break
+        cut = start = match.start()
+
+    if cut == 0:
+        # No sentence end within budget; fall back to a plain word cut
+        return " ".join(student_writing.split()[:max_words]), True
+    return student_writing[:cut], True
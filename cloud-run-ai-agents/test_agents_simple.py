@@ -9,11 +9,40 @@ Tests the key fixes:
 
 import os
 import sys
+import io
 import asyncio
+import contextvars
 
 # Add parent directory to path
 sys.path.insert(0, '/home/user/fun-writing/04-cloud-run-ai-agents')
 
+API_KEY = os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY")
+
+# The tests run concurrently; each one prints into its own buffer, which is
+# written out in order once all have finished
+_TEST_OUTPUT = contextvars.ContextVar("test_output", default=None)
+
+
+class _TestOutput:
+    """Stream that sends writes to the current test's buffer, if any."""
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, text):
+        return (_TEST_OUTPUT.get() or self.stream).write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+
+async def _run_captured(test):
+    """Run a test with its output captured; returns (passed, output)."""
+    buffer = io.StringIO()
+    _TEST_OUTPUT.set(buffer)
+    passed = await test()
+    return passed, buffer.getvalue()
+
 async def test_feedback_agent():
     """Test FeedbackAgent with Google SDK"""
     print("\n" + "="*60)
@@ -147,18 +176,38 @@ async def main():
     print("="*70)
 
     # Check API key
-    api_key = os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY")
-    if api_key:
-        print(f"✅ API Key found: {api_key[:20]}...")
+    if API_KEY:
+        print(f"✅ API Key found: {API_KEY[:20]}...")
     else:
         print("❌ WARNING: No API key found in environment")
 
-    results = {
-        "FeedbackAgent": await test_feedback_agent(),
-        "VisualMediaAgent": await test_visual_media_agent(),
-        "ADK Multimodal": await test_adk_multimodal()
+    tests = {
+        "FeedbackAgent": test_feedback_agent,
+        "VisualMediaAgent": test_visual_media_agent,
+        "ADK Multimodal": test_adk_multimodal
     }
 
+    # Each test is an independent Gemini round-trip, so run them together
+    stdout, stderr = sys.stdout, sys.stderr
+    sys.stdout, sys.stderr = _TestOutput(stdout), _TestOutput(stderr)
+    try:
+        outcomes = await asyncio.gather(
+            *(_run_captured(test) for test in tests.values()),
+            return_exceptions=True
+        )
+    finally:
+        sys.stdout, sys.stderr = stdout, stderr
+
+    results = {}
+    for test_name, outcome in zip(tests, outcomes):
+        if isinstance(outcome, Exception):
+            print(f"❌ {test_name} test raised: {outcome}")
+            results[test_name] = False
+        else:
+            passed, output = outcome
+            print(output, end="")
+            results[test_name] = passed
+
     print("\n" + "="*70)
     print(" TEST RESULTS SUMMARY")
     print("="*70)